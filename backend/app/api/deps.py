@@ -1,36 +1,87 @@
 from __future__ import annotations
 
+from datetime import datetime, timezone
+
 from fastapi import Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from sqlalchemy.orm import Session
 
 from backend.app.core.config import settings
-from backend.app.db.session import get_db
+from backend.app.core.security import JOB_EVENTS_TICKET_PURPOSE
+from backend.app.db.session import SessionLocal, get_db
 from backend.app.models.user import User, UserRole
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.api_prefix}/auth/login")
 
 
 def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)) -> User:
-    credentials_exception = HTTPException(
+    return user_from_token(db, token)
+
+
+async def get_current_user_detached(token: str = Depends(oauth2_scheme)) -> User:
+    """
+    Like get_current_user, but the session is closed before the endpoint
+    runs, so endpoints waiting on JM for seconds do not hold a pooled
+    database connection meanwhile.
+    """
+    return await run_in_threadpool(load_user_from_token, token)
+
+
+def load_user_from_token(token: str) -> User:
+    db = SessionLocal()
+    try:
+        return user_from_token(db, token)
+    finally:
+        db.close()
+
+
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
     )
+
+
+def _token_claims(token: str, purpose: str | None = None) -> dict:
     try:
         payload = jwt.decode(token, settings.secret_key, algorithms=["HS256"])
-        username: str | None = payload.get("sub")
-        if username is None:
-            raise credentials_exception
     except JWTError as exc:
-        raise credentials_exception from exc
+        raise _credentials_exception() from exc
+    # 访问令牌没有 purpose；专用票据只能用于对应的接口
+    if payload.get("sub") is None or payload.get("purpose") != purpose:
+        raise _credentials_exception()
+    return payload
+
 
+def _active_user(db: Session, username: str) -> User:
     user = db.query(User).filter(User.username == username).first()
     if user is None or not user.is_active:
-        raise credentials_exception
+        raise _credentials_exception()
     return user
 
 
+def user_from_token(db: Session, token: str) -> User:
+    return _active_user(db, _token_claims(token)["sub"])
+
+
+def token_expires_at(token: str) -> datetime:
+    """Expiry of an access token that has already been validated."""
+    return datetime.fromtimestamp(jwt.get_unverified_claims(token)["exp"], tz=timezone.utc)
+
+
+def load_user_from_stream_ticket(ticket: str) -> tuple[User, datetime]:
+    """Resolve a job event stream ticket to its user and the session expiry it carries."""
+    payload = _token_claims(ticket, purpose=JOB_EVENTS_TICKET_PURPOSE)
+    db = SessionLocal()
+    try:
+        user = _active_user(db, payload["sub"])
+    finally:
+        db.close()
+    return user, datetime.fromtimestamp(payload["session_exp"], tz=timezone.utc)
+
+
 def require_admin(current_user: User = Depends(get_current_user)) -> User:
     if current_user.role != UserRole.ADMIN:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin permission required")
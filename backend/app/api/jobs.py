@@ -1,18 +1,31 @@
 from __future__ import annotations
 
+import asyncio
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
+import json
 from pathlib import Path
 import re
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
-from fastapi.responses import FileResponse
+import anyio
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, StreamingResponse
 from sqlalchemy.orm import Session
 
-from backend.app.api.deps import get_current_user
+from backend.app.api.deps import (
+    get_current_user,
+    get_current_user_detached,
+    load_user_from_stream_ticket,
+    oauth2_scheme,
+    require_admin,
+    token_expires_at,
+)
 from backend.app.core.config import settings
-from backend.app.db.session import get_db
-from backend.app.models.job import JobStatus, JobType
-from backend.app.models.user import User
+from backend.app.core.security import create_stream_ticket
+from backend.app.db.session import SessionLocal, get_db
+from backend.app.models.job import ArtifactFormat, DownloadJob, JobStatus, JobType, OutputProfile
+from backend.app.models.user import User, UserRole
 from backend.app.schemas.job import (
     CancelJobResponse,
     CleanupJobsResponse,
@@ -20,31 +33,57 @@ from backend.app.schemas.job import (
     DownloadByIdRequest,
     DownloadJobOut,
     DownloadTokenOut,
+    JmHealthOut,
+    JobEventsTicketOut,
     JmLoginRequest,
     JmLoginResponse,
+    ResponseCacheStatsOut,
     SearchRequest,
     SearchResultItem,
 )
 from backend.app.services.crypto_service import decrypt_text, encrypt_text
 from backend.app.services.job_service import (
+    IN_PROGRESS_STATUSES,
+    count_child_jobs_by_status,
     count_user_album_units,
     create_job,
     find_reusable_job_for_user,
     get_job_by_token,
     get_job_for_user,
+    job_activity_by_user,
+    job_change_stamps,
+    list_child_jobs,
     list_jobs_for_user,
     normalize_payload_for_job,
     normalize_multi_album_ids,
     payload_album_units,
+    remove_job_files,
+    sum_child_progress,
 )
 from backend.app.services.job_service import clear_failed_expired_jobs_for_user
-from backend.app.services.jm_service import JmCredential, fetch_favorites, fetch_ranking, search_album, verify_login
-from backend.app.utils.file_utils import safe_remove_path
-from backend.app.workers.job_runner import CANCELLED_MESSAGE, cleanup_job_artifacts, enqueue_job, request_cancel
+from backend.app.services.jm_health import health_tracker
+from backend.app.services.response_cache import response_cache
+from backend.app.services.jm_service import (
+    JmCredential,
+    fetch_favorites,
+    fetch_ranking,
+    invalidate_jm_clients,
+    search_album,
+    verify_login,
+)
+from backend.app.workers.job_runner import (
+    CANCELLED_MESSAGE,
+    cleanup_job_artifacts,
+    enqueue_job,
+    job_held_by_worker,
+    request_cancel,
+)
 
 router = APIRouter(prefix="/jobs", tags=["jobs"])
 
 _PREF_PHOTO_ID_RE = re.compile(r"^p\d+$", flags=re.IGNORECASE)
+# 没有任务变化时定期发送注释行，防止代理因空闲断开连接
+_EVENTS_KEEPALIVE_SECONDS = 15.0
 
 
 def _ensure_utc(dt: datetime | None) -> datetime | None:
@@ -72,6 +111,243 @@ def _to_job_type(target_type: str) -> JobType:
     return mapping[target_type]
 
 
+def _estimate_eta(done: int, total: int, started_at: datetime | None) -> int | None:
+    started_at = _ensure_utc(started_at)
+    if started_at is None or done <= 0 or total <= done:
+        return None
+    elapsed = (datetime.now(timezone.utc) - started_at).total_seconds()
+    return max(0, round(elapsed / done * (total - done)))
+
+
+def _jobs_out(db: Session, jobs: list[DownloadJob]) -> list[DownloadJobOut]:
+    parent_ids = [job.id for job in jobs if job.job_type == JobType.MULTI_ALBUM]
+    counts = count_child_jobs_by_status(db, parent_ids)
+    child_progress = sum_child_progress(db, parent_ids)
+    result: list[DownloadJobOut] = []
+    for job in jobs:
+        out = DownloadJobOut.model_validate(job)
+        by_status = counts.get(job.id)
+        if by_status:
+            out.children_total = sum(by_status.values())
+            out.children_done = sum(by_status.get(value, 0) for value in (JobStatus.DONE, JobStatus.EXPIRED, JobStatus.CLEANED))
+            out.children_failed = by_status.get(JobStatus.FAILED, 0)
+        if job.id in child_progress:
+            for name, value in child_progress[job.id].items():
+                setattr(out, name, value)
+
+        # 预计剩余时间按本阶段认领以来的平均速度估算
+        if job.status in {JobStatus.RUNNING, JobStatus.WAITING}:
+            out.eta_seconds = _estimate_eta(out.images_done, out.images_total, job.claimed_at)
+        elif job.status == JobStatus.MERGING:
+            out.eta_seconds = _estimate_eta(out.pages_merged, out.images_total, job.claimed_at)
+        result.append(out)
+    return result
+
+
+@dataclass(eq=False)
+class _EventSubscriber:
+    user_id: int
+    session_expires_at: datetime
+    queue: asyncio.Queue[str | None] = field(default_factory=asyncio.Queue)
+    # 首次轮询发送完整快照，之后只发送变化
+    primed: bool = False
+
+
+@dataclass
+class _UserEventState:
+    activity: tuple | None
+    stamps: dict[int, tuple]
+
+
+class _JobEventHub:
+    """
+    One change-stamp poller per process shared by every /jobs/events
+    connection. Each tick runs one cheap per-user activity query; the job
+    list of a user is only read again when that user's activity changed,
+    and the result is fanned out to all of the user's connections.
+    """
+
+    def __init__(self) -> None:
+        self._subscribers: set[_EventSubscriber] = set()
+        self._users: dict[int, _UserEventState] = {}
+        self._task: asyncio.Task | None = None
+
+    def subscribe(self, user_id: int, session_expires_at: datetime) -> _EventSubscriber:
+        subscriber = _EventSubscriber(user_id, session_expires_at)
+        self._subscribers.add(subscriber)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return subscriber
+
+    def unsubscribe(self, subscriber: _EventSubscriber) -> None:
+        self._subscribers.discard(subscriber)
+
+    async def _run(self) -> None:
+        # 没有订阅者时轮询任务自行退出，下一个连接到来时重新启动
+        while self._subscribers:
+            subscribers = list(self._subscribers)
+            try:
+                outbox = await run_in_threadpool(self._poll, subscribers)
+            except Exception:  # noqa: BLE001
+                outbox = []
+            for subscriber, message in outbox:
+                subscriber.queue.put_nowait(message)
+            await asyncio.sleep(settings.job_events_poll_seconds)
+
+    def _poll(self, subscribers: list[_EventSubscriber]) -> list[tuple[_EventSubscriber, str | None]]:
+        now = datetime.now(timezone.utc)
+        outbox: list[tuple[_EventSubscriber, str | None]] = []
+        db = SessionLocal()
+        try:
+            user_ids = {subscriber.user_id for subscriber in subscribers}
+            users = {
+                user.id: user
+                for user in db.query(User).filter(User.id.in_(user_ids), User.is_active.is_(True)).all()
+            }
+            # 会话过期、用户被删除或停用后发送 None，由连接推送 expired 并结束
+            live: dict[int, list[_EventSubscriber]] = {}
+            for subscriber in subscribers:
+                if subscriber.user_id not in users or now >= subscriber.session_expires_at:
+                    outbox.append((subscriber, None))
+                else:
+                    live.setdefault(subscriber.user_id, []).append(subscriber)
+
+            watch_all = any(users[user_id].role == UserRole.ADMIN for user_id in live)
+            activity = job_activity_by_user(db, None if watch_all else set(live))
+            for user_id, user_subscribers in live.items():
+                user = users[user_id]
+                if user.role == UserRole.ADMIN:
+                    stamp = (max((value[0] for value in activity.values()), default=None), sum(value[1] for value in activity.values()))
+                else:
+                    stamp = activity.get(user_id)
+                state = self._users.get(user_id)
+                fresh = [subscriber for subscriber in user_subscribers if not subscriber.primed]
+                if state is not None and state.activity == stamp and not fresh:
+                    continue
+                outbox.extend(self._user_messages(db, user, stamp, state, user_subscribers))
+            # 已无连接的用户不再保留状态
+            for user_id in list(self._users):
+                if user_id not in live:
+                    del self._users[user_id]
+        finally:
+            db.close()
+        return outbox
+
+    def _user_messages(
+        self,
+        db: Session,
+        user: User,
+        activity: tuple | None,
+        state: _UserEventState | None,
+        subscribers: list[_EventSubscriber],
+    ) -> list[tuple[_EventSubscriber, str]]:
+        previous = state.stamps if state is not None else {}
+        stamps = job_change_stamps(db, user)
+        self._users[user.id] = _UserEventState(activity, stamps)
+        changed_ids = {job_id for job_id, stamp in stamps.items() if previous.get(job_id) != stamp}
+        removed_ids = [job_id for job_id in previous if job_id not in stamps]
+        # 新连接需要完整快照，否则只查询变化的任务
+        needs_snapshot = any(not subscriber.primed for subscriber in subscribers)
+        wanted = list(stamps) if needs_snapshot else list(changed_ids)
+        outs: list[DownloadJobOut] = []
+        if wanted:
+            jobs = db.query(DownloadJob).filter(DownloadJob.id.in_(wanted)).order_by(DownloadJob.id.desc()).all()
+            outs = _jobs_out(db, jobs)
+
+        update = ""
+        changed = [out.model_dump(mode="json") for out in outs if out.id in changed_ids]
+        if changed:
+            update += _sse_message("jobs", changed)
+        if removed_ids:
+            update += _sse_message("removed", removed_ids)
+        snapshot = _sse_message("snapshot", [out.model_dump(mode="json") for out in outs]) if needs_snapshot else ""
+
+        messages: list[tuple[_EventSubscriber, str]] = []
+        for subscriber in subscribers:
+            if not subscriber.primed:
+                subscriber.primed = True
+                messages.append((subscriber, snapshot))
+            elif update:
+                messages.append((subscriber, update))
+        return messages
+
+
+_event_hub = _JobEventHub()
+
+
+def _sse_message(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def _job_event_stream(request: Request, user_id: int, session_expires_at: datetime):
+    # 在生成器内订阅，响应未开始发送就断开的连接不会留下订阅者
+    subscriber = _event_hub.subscribe(user_id, session_expires_at)
+    try:
+        while True:
+            try:
+                message = await asyncio.wait_for(subscriber.queue.get(), timeout=_EVENTS_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    return
+                yield ": keep-alive\n\n"
+                continue
+            if message is None:
+                # 通知前端停止自动重连，改回带令牌校验的普通请求
+                yield _sse_message("expired", None)
+                return
+            yield message
+    finally:
+        _event_hub.unsubscribe(subscriber)
+
+
+_upstream_limiter: anyio.CapacityLimiter | None = None
+
+
+async def _run_upstream(func, *args):
+    """
+    Run a blocking JM call on a worker thread under JM_UPSTREAM_CONCURRENCY.
+    Requests over the limit wait in the event loop without holding a thread,
+    so slow upstream calls cannot starve the threadpool used by other endpoints.
+    """
+    global _upstream_limiter
+    # CapacityLimiter 需要在事件循环中创建
+    if _upstream_limiter is None:
+        _upstream_limiter = anyio.CapacityLimiter(max(1, settings.jm_upstream_concurrency))
+    return await anyio.to_thread.run_sync(func, *args, limiter=_upstream_limiter)
+
+
+def _save_jm_credential(user_id: int, username: str, password: str) -> None:
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.id == user_id).first()
+        if user is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+        user.jm_username = username
+        user.jm_password_encrypted = encrypt_text(password)
+        db.commit()
+    finally:
+        db.close()
+    invalidate_jm_clients(user_id)
+
+
+def _cancel_job(job: DownloadJob) -> None:
+    # 执行中的任务由持有租约的 worker 在察觉取消后自行清理，避免删除它仍在写入的目录
+    held = job_held_by_worker(job)
+    request_cancel(job.id)
+    if not held:
+        cleanup_job_artifacts(job.id)
+        remove_job_files(job)
+
+    job.status = JobStatus.FAILED
+    job.error_message = CANCELLED_MESSAGE
+    job.result_file_path = None
+    job.result_file_name = None
+    job.source_dir = None
+    job.download_token = None
+    job.merged_at = None
+    job.expires_at = None
+
+
 def _enforce_user_album_limit(db: Session, user: User, job_type: JobType, payload: dict) -> None:
     request_units = payload_album_units(job_type, payload)
     if request_units <= 0:
@@ -89,7 +365,7 @@ def _enforce_user_album_limit(db: Session, user: User, job_type: JobType, payloa
         inflight_units = count_user_album_units(
             db,
             user.id,
-            statuses={JobStatus.QUEUED, JobStatus.RUNNING, JobStatus.MERGING},
+            statuses=set(IN_PROGRESS_STATUSES),
         )
         if inflight_units + request_units > inflight_limit:
             raise HTTPException(
@@ -103,7 +379,7 @@ def _enforce_user_album_limit(db: Session, user: User, job_type: JobType, payloa
         window_units = count_user_album_units(
             db,
             user.id,
-            statuses={JobStatus.QUEUED, JobStatus.RUNNING, JobStatus.MERGING, JobStatus.DONE},
+            statuses=IN_PROGRESS_STATUSES | {JobStatus.DONE},
             window_minutes=window_minutes,
         )
         if window_units + request_units > window_limit:
@@ -117,66 +393,71 @@ def _enforce_user_album_limit(db: Session, user: User, job_type: JobType, payloa
 
 
 @router.post("/jm-login", response_model=JmLoginResponse)
-def jm_login(
+async def jm_login(
     payload: JmLoginRequest,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user_detached),
 ) -> JmLoginResponse:
     credential = JmCredential(username=payload.username, password=payload.password)
     try:
-        verify_login(credential)
+        await _run_upstream(verify_login, credential)
     except Exception as exc:  # noqa: BLE001
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"JM login failed: {exc}") from exc
 
     if payload.save_to_user:
-        user = db.query(User).filter(User.id == current_user.id).first()
-        if user is None:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-        user.jm_username = payload.username
-        user.jm_password_encrypted = encrypt_text(payload.password)
-        db.commit()
+        await run_in_threadpool(_save_jm_credential, current_user.id, payload.username, payload.password)
 
     return JmLoginResponse(ok=True)
 
 
 @router.post("/search", response_model=list[SearchResultItem])
-def search(
+async def search(
     payload: SearchRequest,
-    current_user: User = Depends(get_current_user),
+    current_user: User = Depends(get_current_user_detached),
 ) -> list[SearchResultItem]:
     credential = _get_saved_jm_credential(current_user)
     try:
-        return search_album(payload.keyword, payload.page, credential)
+        return await _run_upstream(search_album, payload.keyword, payload.page, credential, current_user.id)
     except Exception as exc:  # noqa: BLE001
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Search failed: {exc}") from exc
 
 
 @router.get("/favorites", response_model=list[SearchResultItem])
-def favorites(
+async def favorites(
     page: int = Query(default=1, ge=1, le=200),
-    current_user: User = Depends(get_current_user),
+    current_user: User = Depends(get_current_user_detached),
 ) -> list[SearchResultItem]:
     credential = _get_saved_jm_credential(current_user)
     if credential is None:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Please login JM account first")
     try:
-        return fetch_favorites(page, credential)
+        return await _run_upstream(fetch_favorites, page, credential, current_user.id)
     except Exception as exc:  # noqa: BLE001
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Fetch favorites failed: {exc}") from exc
 
 
 @router.get("/ranking/week", response_model=list[SearchResultItem])
-def ranking_week(
+async def ranking_week(
     page: int = Query(default=1, ge=1, le=200),
-    current_user: User = Depends(get_current_user),
+    current_user: User = Depends(get_current_user_detached),
 ) -> list[SearchResultItem]:
     credential = _get_saved_jm_credential(current_user)
     try:
-        return fetch_ranking(page, credential)
+        return await _run_upstream(fetch_ranking, page, credential, current_user.id)
     except Exception as exc:  # noqa: BLE001
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Fetch ranking failed: {exc}") from exc
 
 
+@router.get("/cache-stats", response_model=ResponseCacheStatsOut)
+def cache_stats(_: User = Depends(require_admin)) -> ResponseCacheStatsOut:
+    # 统计只覆盖当前进程
+    return ResponseCacheStatsOut.model_validate(response_cache.stats())
+
+
+@router.get("/jm-health", response_model=list[JmHealthOut])
+def jm_health(_: User = Depends(require_admin)) -> list[JmHealthOut]:
+    return [JmHealthOut.model_validate(item) for item in health_tracker.snapshot()]
+
+
 @router.post("/download-by-id", response_model=DownloadJobOut)
 def download_by_id(
     payload: DownloadByIdRequest,
@@ -213,12 +494,23 @@ def download_by_id(
         body = {"id_value": payload.id_value}
 
     body = normalize_payload_for_job(job_type, body)
-    reusable = find_reusable_job_for_user(db, current_user, job_type, body)
+    reusable = find_reusable_job_for_user(
+        db, current_user, job_type, body, payload.artifact_format, payload.output_profile
+    )
     if reusable is not None:
         return DownloadJobOut.model_validate(reusable)
 
     _enforce_user_album_limit(db, current_user, job_type, body)
-    job = create_job(db, current_user, job_type, body)
+    job = create_job(
+        db,
+        current_user,
+        job_type,
+        body,
+        payload.artifact_format,
+        payload.output_profile,
+        image_threads=payload.image_threads,
+        photo_threads=payload.photo_threads,
+    )
     enqueue_job(job.id)
     return DownloadJobOut.model_validate(job)
 
@@ -226,17 +518,21 @@ def download_by_id(
 @router.post("/download-from-search/{album_id}", response_model=DownloadJobOut)
 def download_from_search(
     album_id: str,
+    artifact_format: ArtifactFormat = Query(default=ArtifactFormat.PDF),
+    output_profile: OutputProfile = Query(default=OutputProfile.ARCHIVE),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ) -> DownloadJobOut:
     payload = {"id_value": album_id}
     payload = normalize_payload_for_job(JobType.ALBUM, payload)
-    reusable = find_reusable_job_for_user(db, current_user, JobType.ALBUM, payload)
+    reusable = find_reusable_job_for_user(
+        db, current_user, JobType.ALBUM, payload, artifact_format, output_profile
+    )
     if reusable is not None:
         return DownloadJobOut.model_validate(reusable)
 
     _enforce_user_album_limit(db, current_user, JobType.ALBUM, payload)
-    job = create_job(db, current_user, JobType.ALBUM, payload)
+    job = create_job(db, current_user, JobType.ALBUM, payload, artifact_format, output_profile)
     enqueue_job(job.id)
     return DownloadJobOut.model_validate(job)
 
@@ -247,7 +543,35 @@ def list_jobs(
     db: Session = Depends(get_db),
 ) -> list[DownloadJobOut]:
     jobs = list_jobs_for_user(db, current_user)
-    return [DownloadJobOut.model_validate(job) for job in jobs]
+    return _jobs_out(db, jobs)
+
+
+@router.post("/events/ticket", response_model=JobEventsTicketOut)
+def create_job_events_ticket(
+    current_user: User = Depends(get_current_user),
+    token: str = Depends(oauth2_scheme),
+) -> JobEventsTicketOut:
+    ticket, expires_at = create_stream_ticket(current_user.username, token_expires_at(token))
+    return JobEventsTicketOut(ticket=ticket, expires_at=expires_at)
+
+
+@router.get("/events")
+async def job_events(request: Request, ticket: str = Query(min_length=1)) -> StreamingResponse:
+    """
+    Server-Sent Events stream of the caller's jobs: one `snapshot` event with
+    the full list, then `jobs` events with changed jobs and `removed` events
+    with deleted job ids. EventSource cannot send headers, so the stream is
+    opened with a short-lived ticket from POST /jobs/events/ticket rather
+    than the access token, keeping the token out of URLs and access logs.
+    The stream ends with an `expired` event once the session that issued the
+    ticket expires or the user is disabled.
+    """
+    user, session_expires_at = await run_in_threadpool(load_user_from_stream_ticket, ticket)
+    return StreamingResponse(
+        _job_event_stream(request, user.id, session_expires_at),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.delete("/clear-failed-expired", response_model=CleanupJobsResponse)
@@ -266,7 +590,17 @@ def get_job(
     db: Session = Depends(get_db),
 ) -> DownloadJobOut:
     job = get_job_for_user(db, current_user, job_id)
-    return DownloadJobOut.model_validate(job)
+    return _jobs_out(db, [job])[0]
+
+
+@router.get("/{job_id}/children", response_model=list[DownloadJobOut])
+def get_job_children(
+    job_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+) -> list[DownloadJobOut]:
+    job = get_job_for_user(db, current_user, job_id)
+    return [DownloadJobOut.model_validate(child) for child in list_child_jobs(db, job)]
 
 
 @router.delete("/{job_id}", response_model=DeleteJobResponse)
@@ -277,17 +611,18 @@ def delete_job(
 ) -> DeleteJobResponse:
     job = get_job_for_user(db, current_user, job_id)
 
-    if job.status in {JobStatus.QUEUED, JobStatus.RUNNING, JobStatus.MERGING}:
-        request_cancel(job.id)
-    cleanup_job_artifacts(job.id)
-
-    if job.result_file_path:
-        safe_remove_path(Path(job.result_file_path).parent)
-    if job.source_dir:
-        source_path = Path(job.source_dir)
-        safe_remove_path(source_path)
-        safe_remove_path(source_path.parent)
-
+    children = list_child_jobs(db, job)
+    for target in [*children, job]:
+        if target.status in IN_PROGRESS_STATUSES:
+            request_cancel(target.id)
+        # 执行中的任务被删除后，worker 发现记录不存在时会自行清理目录
+        if not job_held_by_worker(target):
+            cleanup_job_artifacts(target.id)
+            remove_job_files(target)
+    for child in children:
+        db.delete(child)
+    # 先删子任务，避免数据库外键级联删除后 ORM 再删同一行
+    db.flush()
     db.delete(job)
     db.commit()
     return DeleteJobResponse(deleted=True)
@@ -303,24 +638,11 @@ def cancel_job(
     if job.status in {JobStatus.DONE, JobStatus.EXPIRED, JobStatus.CLEANED, JobStatus.FAILED}:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Job status is {job.status.value}")
 
-    request_cancel(job.id)
-    cleanup_job_artifacts(job.id)
-
-    if job.result_file_path:
-        safe_remove_path(Path(job.result_file_path).parent)
-    if job.source_dir:
-        source_path = Path(job.source_dir)
-        safe_remove_path(source_path)
-        safe_remove_path(source_path.parent)
-
-    job.status = JobStatus.FAILED
-    job.error_message = CANCELLED_MESSAGE
-    job.result_file_path = None
-    job.result_file_name = None
-    job.source_dir = None
-    job.download_token = None
-    job.merged_at = None
-    job.expires_at = None
+    # 中止 multi_album 任务时一并中止尚未结束的单本子任务；其他进程中的 worker 约在 JOB_PROGRESS_FLUSH_SECONDS 内察觉并停止
+    for child in list_child_jobs(db, job):
+        if child.status in IN_PROGRESS_STATUSES:
+            _cancel_job(child)
+    _cancel_job(job)
     db.commit()
 
     return CancelJobResponse(cancelled=True)
@@ -8,6 +8,7 @@ from backend.app.db.session import get_db
 from backend.app.models.user import User
 from backend.app.schemas.user import JmCredentialUpdateRequest, UserCreateRequest, UserDeleteResponse, UserOut
 from backend.app.services.crypto_service import encrypt_text
+from backend.app.services.jm_service import invalidate_jm_clients
 from backend.app.services.user_service import create_user
 
 router = APIRouter(prefix="/users", tags=["users"])
@@ -47,6 +48,7 @@ def delete_user_api(
 
     db.delete(user)
     db.commit()
+    invalidate_jm_clients(user_id)
     return UserDeleteResponse(deleted=True)
 
 
@@ -63,5 +65,6 @@ def update_my_jm_credentials(
     user.jm_username = payload.jm_username
     user.jm_password_encrypted = encrypt_text(payload.jm_password)
     db.commit()
+    invalidate_jm_clients(user.id)
     db.refresh(user)
     return UserOut.model_validate(user)
@@ -24,7 +24,41 @@ class Settings(BaseSettings):
     temp_root: Path = Path("./backend/storage/tmp")
     link_expire_minutes: int = 60
 
+    # 下载阶段并发（网络受限）；合并阶段并发（CPU 受限），两者各自占用独立的槽位
     max_parallel_jobs: int = 2
+    max_parallel_merges: int = 2
+    # 按吞吐、上游错误率与 CPU 负载在上下限之间自动调整下载阶段并发，MAX_PARALLEL_JOBS 作为初始值
+    adaptive_concurrency_enabled: bool = False
+    adaptive_min_parallel_jobs: int = 1
+    adaptive_max_parallel_jobs: int = 8
+    adaptive_interval_seconds: float = 30.0
+    # 上游错误率（失败图片与失败请求占比）或每核 1 分钟负载超过阈值时减半并发
+    adaptive_error_rate_threshold: float = 0.2
+    adaptive_cpu_load_threshold: float = 0.9
+    # 关闭后 API 进程不执行任务，需单独运行 `python -m backend.app.workers`
+    embedded_worker_enabled: bool = True
+    # 数据库任务队列：空闲时的轮询间隔、租约时长与心跳间隔（秒）
+    job_poll_interval_seconds: float = 2.0
+    job_lease_seconds: int = 90
+    job_heartbeat_seconds: int = 20
+    # 工作进程中断（重启、崩溃）后任务自动续跑，累计中断达到该次数后标记为失败
+    job_max_attempts: int = 3
+    # 任务进度在内存中累计，按该间隔批量写入数据库
+    job_progress_flush_seconds: float = 1.0
+    # SSE 任务事件流检查任务变化的间隔
+    job_events_poll_seconds: float = 1.0
+    # 打开事件流用的专用票据有效期（秒），只在建立连接时校验
+    job_events_ticket_seconds: int = 30
+
+    # 合并阶段的页面转换进程池；0 表示按 CPU 核数
+    pdf_convert_workers: int = 0
+    pdf_convert_workers_per_job: int = 4
+    # 下载期间即开始转换已完成的页面
+    merge_pipeline_enabled: bool = True
+    # multi_album 任务同时生成的本子 PDF 数（仅在不拆分子任务时使用）
+    multi_album_build_workers: int = 2
+    # multi_album 任务拆成每个本子一个子任务，由各 worker 并行下载与合并，失败的本子单独重试
+    multi_album_split_enabled: bool = True
 
     default_admin_username: str = "admin"
     default_admin_password: str = "admin123"
@@ -36,8 +70,36 @@ class Settings(BaseSettings):
     jm_timeout_seconds: int = 15
     jm_html_domains: str | None = None
     jm_api_domains: str | None = None
+    # 搜索/收藏/排行复用已登录的客户端：池中最多保留的客户端数与存活时间（秒），任一为 0 时不复用
+    jm_client_pool_size: int = 64
+    jm_client_ttl_seconds: int = 1800
+    # 按延迟与失败记录为客户端实现和域名排序；连续失败达到阈值后熔断，后台定期探测恢复
+    jm_health_enabled: bool = True
+    jm_circuit_failure_threshold: int = 3
+    jm_circuit_open_seconds: int = 60
+    jm_health_probe_interval_seconds: int = 30
+    # 搜索/收藏/排行的对冲请求：首选实现超过该延迟（毫秒）未返回时并行请求备用实现，先成功者胜出
+    jm_hedge_enabled: bool = False
+    jm_hedge_delay_ms: int = 800
+    # 搜索/收藏/排行/JM 登录同时访问上游的请求数上限；超出的请求在事件循环中排队，不占用线程
+    jm_upstream_concurrency: int = 16
+    # 搜索/周排行/收藏夹的响应缓存：memory（本进程）、database（多个进程共享）或 none
+    response_cache_backend: str = "memory"
+    response_cache_max_entries: int = 1024
+    # 各接口的缓存时长（秒），0 表示不缓存
+    search_cache_ttl_seconds: int = 300
+    ranking_cache_ttl_seconds: int = 1800
+    favorites_cache_ttl_seconds: int = 60
+    # 单个任务的图片/章节下载线程数（jmcomic download.threading），任务可单独覆盖
+    jm_image_threads: int = 8
+    jm_photo_threads: int = 2
+    # 本进程所有任务同时进行的图片请求总数上限（0 不限制），避免并行任务成倍放大连接数
+    jm_image_request_budget: int = 32
 
     user_album_limit_inflight: int = 20
+    # 调度：每个用户同时运行的任务数上限（0 不限制），管理员任务是否优先认领
+    user_max_running_jobs: int = 0
+    admin_job_priority: bool = False
     user_album_limit_window_count: int = 100
     user_album_limit_window_minutes: int = 60
     user_album_limit_per_job: int = 20
@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+import os
+import time
+
+from backend.app import models  # noqa: F401  注册全部模型，ensure_schema 才能建表
+from backend.app.core.config import settings
+from backend.app.db.schema import ensure_schema
+from backend.app.db.session import engine
+from backend.app.services.jm_health import install_client_tracking
+from backend.app.utils.file_utils import ensure_dir
+
+
+def apply_app_timezone() -> None:
+    os.environ["TZ"] = settings.app_timezone
+    if hasattr(time, "tzset"):
+        time.tzset()
+
+
+def prepare_runtime() -> None:
+    # API 进程与独立 worker 进程共用的启动准备
+    apply_app_timezone()
+    ensure_dir(settings.download_root)
+    ensure_dir(settings.temp_root)
+    ensure_schema(engine)
+    install_client_tracking()
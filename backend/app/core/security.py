@@ -10,6 +10,9 @@ from backend.app.core.config import settings
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# 事件流票据的用途声明；带 purpose 的令牌不能当作访问令牌使用
+JOB_EVENTS_TICKET_PURPOSE = "job-events"
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
@@ -23,3 +26,21 @@ def create_access_token(subject: str, expires_delta: timedelta | None = None) ->
     expire = datetime.now(timezone.utc) + (expires_delta or timedelta(minutes=settings.access_token_expire_minutes))
     to_encode: dict[str, Any] = {"sub": subject, "exp": expire}
     return jwt.encode(to_encode, settings.secret_key, algorithm="HS256")
+
+
+def create_stream_ticket(subject: str, session_expires_at: datetime) -> tuple[str, datetime]:
+    """
+    A short-lived ticket that only opens the job event stream. It carries the
+    access token's expiry so the stream still ends when the session does.
+    """
+    expire = min(
+        datetime.now(timezone.utc) + timedelta(seconds=settings.job_events_ticket_seconds),
+        session_expires_at,
+    )
+    to_encode: dict[str, Any] = {
+        "sub": subject,
+        "exp": expire,
+        "purpose": JOB_EVENTS_TICKET_PURPOSE,
+        "session_exp": int(session_expires_at.timestamp()),
+    }
+    return jwt.encode(to_encode, settings.secret_key, algorithm="HS256"), expire
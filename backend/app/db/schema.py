@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+from sqlalchemy import Enum, inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import CreateColumn
+
+from backend.app.db.base import Base
+
+
+def ensure_schema(bind: Engine) -> None:
+    """
+    Create missing tables, then add columns introduced after a table was first
+    created. create_all() alone never alters existing tables, and there is no
+    migration tool in this project, so new columns must be nullable or carry a
+    server_default.
+    """
+    Base.metadata.create_all(bind=bind)
+
+    inspector = inspect(bind)
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            added: set[str] = set()
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_ddl = CreateColumn(column).compile(dialect=bind.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column_ddl}"))
+                added.add(column.name)
+
+            for index in table.indexes:
+                if added.intersection(column.name for column in index.columns):
+                    index.create(conn, checkfirst=True)
+
+    _sync_native_enum_values(bind)
+
+
+def _sync_native_enum_values(bind: Engine) -> None:
+    """
+    Add enum members introduced after a native ENUM column was created.
+    SQLite stores enums as plain strings and needs nothing here.
+    """
+    dialect = bind.dialect.name
+    if dialect not in {"postgresql", "mysql", "mariadb"}:
+        return
+
+    inspector = inspect(bind)
+    # PostgreSQL 的 ALTER TYPE ... ADD VALUE 新值在同一事务内不可用，单独以自动提交执行
+    with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for table in Base.metadata.sorted_tables:
+            reflected = {column["name"]: column["type"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if not isinstance(column.type, Enum) or not column.type.native_enum:
+                    continue
+                existing = set(getattr(reflected.get(column.name), "enums", None) or [])
+                missing = [value for value in column.type.enums if value not in existing]
+                if not existing or not missing:
+                    continue
+                if dialect == "postgresql":
+                    for value in missing:
+                        conn.execute(text(f"ALTER TYPE {column.type.name} ADD VALUE IF NOT EXISTS '{value}'"))
+                else:
+                    column_ddl = CreateColumn(column).compile(dialect=bind.dialect)
+                    conn.execute(text(f"ALTER TABLE {table.name} MODIFY COLUMN {column_ddl}"))
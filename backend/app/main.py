@@ -1,20 +1,22 @@
 from __future__ import annotations
 
-import os
-import time
-
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from backend.app.api import auth, jobs, users
 from backend.app.core.config import settings
-from backend.app.db.base import Base
-from backend.app.db.session import SessionLocal, engine
+from backend.app.core.runtime import prepare_runtime
+from backend.app.db.session import SessionLocal
 from backend.app.models import DownloadJob, User  # noqa: F401
+from backend.app.services.image_pdf_service import shutdown_convert_pool
 from backend.app.services.user_service import ensure_default_admin
-from backend.app.utils.file_utils import ensure_dir
-from backend.app.workers.job_runner import recover_unfinished_jobs
-from backend.app.workers.scheduler import start_cleanup_scheduler
+from backend.app.workers.job_runner import recover_unfinished_jobs, start_job_worker, stop_job_worker
+from backend.app.workers.scheduler import (
+    start_cleanup_scheduler,
+    start_health_probe,
+    stop_cleanup_scheduler,
+    stop_health_probe,
+)
 
 
 app = FastAPI(title=settings.app_name)
@@ -28,18 +30,9 @@ app.add_middleware(
 )
 
 
-def _apply_app_timezone() -> None:
-    os.environ["TZ"] = settings.app_timezone
-    if hasattr(time, "tzset"):
-        time.tzset()
-
-
 @app.on_event("startup")
 def on_startup() -> None:
-    _apply_app_timezone()
-    ensure_dir(settings.download_root)
-    ensure_dir(settings.temp_root)
-    Base.metadata.create_all(bind=engine)
+    prepare_runtime()
 
     db = SessionLocal()
     try:
@@ -47,8 +40,23 @@ def on_startup() -> None:
     finally:
         db.close()
 
-    recover_unfinished_jobs()
-    start_cleanup_scheduler()
+    # 搜索、收藏等接口直接请求 JM，API 进程也要探测熔断中的域名
+    start_health_probe()
+
+    # 关闭后由独立的 `python -m backend.app.workers` 进程执行任务与清理，API 只负责入队和查询
+    if settings.embedded_worker_enabled:
+        recover_unfinished_jobs()
+        start_job_worker()
+        start_cleanup_scheduler()
+
+
+@app.on_event("shutdown")
+def on_shutdown() -> None:
+    stop_health_probe()
+    if settings.embedded_worker_enabled:
+        stop_job_worker()
+        stop_cleanup_scheduler()
+        shutdown_convert_pool()
 
 
 @app.get("/health")
@@ -1,10 +1,14 @@
-from backend.app.models.job import DownloadJob, JobStatus, JobType
+from backend.app.models.cache import CachedResponse
+from backend.app.models.job import ArtifactFormat, DownloadJob, JobStatus, JobType, OutputProfile
 from backend.app.models.user import User, UserRole
 
 __all__ = [
+    "CachedResponse",
     "User",
     "UserRole",
+    "ArtifactFormat",
     "DownloadJob",
     "JobType",
     "JobStatus",
+    "OutputProfile",
 ]
@@ -3,7 +3,7 @@ from __future__ import annotations
 import enum
 from datetime import datetime, timezone
 
-from sqlalchemy import DateTime, Enum, ForeignKey, Integer, String, Text
+from sqlalchemy import BigInteger, DateTime, Enum, ForeignKey, Integer, String, Text
 from sqlalchemy.orm import Mapped, mapped_column
 
 from backend.app.db.base import Base
@@ -15,9 +15,23 @@ class JobType(str, enum.Enum):
     MULTI_ALBUM = "multi_album"
 
 
+class ArtifactFormat(str, enum.Enum):
+    PDF = "pdf"
+    CBZ = "cbz"
+
+
+class OutputProfile(str, enum.Enum):
+    ARCHIVE = "archive"
+    BALANCED = "balanced"
+    MOBILE = "mobile"
+
+
 class JobStatus(str, enum.Enum):
     QUEUED = "queued"
     RUNNING = "running"
+    # multi_album 任务已拆分为单本子任务，等待它们全部结束
+    WAITING = "waiting"
+    DOWNLOADED = "downloaded"
     MERGING = "merging"
     DONE = "done"
     FAILED = "failed"
@@ -30,10 +44,26 @@ class DownloadJob(Base):
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), index=True)
+    # multi_album 拆分出的单本子任务指向所属的父任务，不在任务列表中单独展示
+    parent_job_id: Mapped[int | None] = mapped_column(
+        ForeignKey("download_jobs.id", ondelete="CASCADE"), index=True, nullable=True
+    )
 
     job_type: Mapped[JobType] = mapped_column(Enum(JobType), nullable=False)
     payload_json: Mapped[str] = mapped_column(Text, nullable=False)
     status: Mapped[JobStatus] = mapped_column(Enum(JobStatus), default=JobStatus.QUEUED, nullable=False)
+    artifact_format: Mapped[ArtifactFormat] = mapped_column(
+        Enum(ArtifactFormat, native_enum=False, length=16),
+        default=ArtifactFormat.PDF,
+        server_default=ArtifactFormat.PDF.name,
+        nullable=False,
+    )
+    output_profile: Mapped[OutputProfile] = mapped_column(
+        Enum(OutputProfile, native_enum=False, length=16),
+        default=OutputProfile.ARCHIVE,
+        server_default=OutputProfile.ARCHIVE.name,
+        nullable=False,
+    )
 
     result_file_path: Mapped[str | None] = mapped_column(Text, nullable=True)
     result_file_name: Mapped[str | None] = mapped_column(String(255), nullable=True)
@@ -45,5 +75,25 @@ class DownloadJob(Base):
 
     error_message: Mapped[str | None] = mapped_column(Text, nullable=True)
 
+    # 任务队列租约：领取任务的工作进程需定期续约，过期即视为失联
+    lease_owner: Mapped[str | None] = mapped_column(String(128), nullable=True)
+    lease_expires_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), index=True, nullable=True)
+    heartbeat_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    claimed_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    attempts: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+
+    # 覆盖 JM_IMAGE_THREADS / JM_PHOTO_THREADS，为空时使用全局配置
+    image_threads: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    photo_threads: Mapped[int | None] = mapped_column(Integer, nullable=True)
+
+    # 执行进度，由工作进程批量写入；images_total 随章节详情陆续获取而增长
+    images_total: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    images_done: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    bytes_downloaded: Mapped[int] = mapped_column(BigInteger, default=0, server_default="0", nullable=False)
+    pages_merged: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    # 合并时直接嵌入与重新编码的页数
+    pages_passthrough: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    pages_reencoded: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
     updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc), nullable=False)
@@ -3,13 +3,18 @@ from typing import Literal
 
 from pydantic import BaseModel, ConfigDict, Field, field_validator
 
-from backend.app.models.job import JobStatus, JobType
+from backend.app.models.job import ArtifactFormat, JobStatus, JobType, OutputProfile
 
 
 class DownloadByIdRequest(BaseModel):
     target_type: Literal["album", "photo", "multi_album"]
     id_value: str | None = None
     album_ids: list[str] | None = None
+    artifact_format: ArtifactFormat = ArtifactFormat.PDF
+    output_profile: OutputProfile = OutputProfile.ARCHIVE
+    # 为空时使用全局下载线程配置
+    image_threads: int | None = Field(default=None, ge=1, le=64)
+    photo_threads: int | None = Field(default=None, ge=1, le=16)
 
 
 class SearchRequest(BaseModel):
@@ -22,19 +27,64 @@ class SearchResultItem(BaseModel):
     title: str
 
 
+class ResponseCacheNamespaceStats(BaseModel):
+    hits: int
+    misses: int
+    # 等待同一个进行中请求的次数
+    coalesced: int
+    errors: int
+    # 等待超时后自行请求上游的次数
+    wait_timeouts: int = 0
+
+
+class ResponseCacheStatsOut(BaseModel):
+    backend: str
+    namespaces: dict[str, ResponseCacheNamespaceStats]
+
+
+class JmHealthOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    impl: str
+    # 为空时是该客户端实现所有域名的汇总
+    domain: str | None = None
+    latency_ms: int | None = None
+    successes: int
+    failures: int
+    consecutive_failures: int
+    circuit_open: bool
+
+
 class DownloadJobOut(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
     id: int
     user_id: int
+    parent_job_id: int | None = None
     job_type: JobType
     status: JobStatus
+    artifact_format: ArtifactFormat = ArtifactFormat.PDF
+    output_profile: OutputProfile = OutputProfile.ARCHIVE
+    image_threads: int | None = None
+    photo_threads: int | None = None
     payload_json: str
     result_file_name: str | None = None
     expires_at: datetime | None = None
     error_message: str | None = None
     created_at: datetime
     updated_at: datetime
+    # multi_album 任务拆分出的单本子任务统计
+    children_total: int = 0
+    children_done: int = 0
+    children_failed: int = 0
+    # 执行进度；拆分后的 multi_album 任务为各本子之和
+    images_total: int = 0
+    images_done: int = 0
+    bytes_downloaded: int = 0
+    pages_merged: int = 0
+    pages_passthrough: int = 0
+    pages_reencoded: int = 0
+    eta_seconds: int | None = None
 
     @field_validator("expires_at", "created_at", "updated_at", mode="before")
     @classmethod
@@ -48,6 +98,11 @@ class DownloadJobOut(BaseModel):
         return value
 
 
+class JobEventsTicketOut(BaseModel):
+    ticket: str
+    expires_at: datetime
+
+
 class DownloadTokenOut(BaseModel):
     download_url: str
     expires_at: datetime
@@ -1,17 +1,85 @@
 from __future__ import annotations
 
+import math
+import multiprocessing
+import os
 import re
 import zipfile
+from collections.abc import Iterator
+from contextlib import contextmanager
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    CancelledError,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    as_completed,
+    wait,
+)
+from dataclasses import dataclass
+from io import BytesIO
 from pathlib import Path
+from queue import SimpleQueue
+from threading import Lock, Semaphore, Thread
 
-import img2pdf
-from PIL import Image
+from PIL import Image, ImageChops, ImageOps
 
-from backend.app.models.job import JobType
+from backend.app.core.config import settings
+from backend.app.models.job import ArtifactFormat, JobType, OutputProfile
+from backend.app.utils.cancellation import CancellationToken
 from backend.app.utils.file_utils import ensure_dir, sanitize_filename
+from backend.app.utils.progress import JobProgress
+from backend.app.utils.pdf_writer import DEFAULT_DPI, StreamingPdfWriter
 
 SUPPORTED_IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp", ".bmp"}
 _DIGIT_SPLIT_RE = re.compile(r"\d+|\D+")
+_EXIF_ORIENTATION_TAG = 0x0112
+# 页面一律按该 DPI 排版，只有输出配置的缩放会改变 PDF 中的页面尺寸
+_BASE_DPI = DEFAULT_DPI
+# 缩略图各通道差值不超过该阈值即视为黑白页面（容忍 JPEG 色度噪声）
+_GRAYSCALE_TOLERANCE = 16
+_GRAYSCALE_SAMPLE_SIZE = (128, 128)
+# IJG 标准亮度量化表（quality 50）各项之和，用于由量化表反推 JPEG 质量
+_STD_LUMA_QUANT_SUM = 3688
+
+# PDF 可以不经解码直接嵌入的格式与色彩模式
+_EMBEDDABLE_MODES = {"JPEG": {"RGB", "L"}, "PNG": {"RGB", "L"}}
+
+_convert_pool: ProcessPoolExecutor | None = None
+_convert_pool_lock = Lock()
+
+
+@dataclass(frozen=True)
+class EncodingProfile:
+    max_width: int | None
+    jpeg_quality: int
+    auto_grayscale: bool
+    # 有损档位只直接嵌入质量不高于 jpeg_quality 的 JPEG，PNG 一律重编码；archive 保留原图
+    lossy: bool = True
+
+
+ENCODING_PROFILES: dict[OutputProfile, EncodingProfile] = {
+    OutputProfile.ARCHIVE: EncodingProfile(
+        max_width=None, jpeg_quality=95, auto_grayscale=False, lossy=False
+    ),
+    OutputProfile.BALANCED: EncodingProfile(max_width=1600, jpeg_quality=85, auto_grayscale=True),
+    OutputProfile.MOBILE: EncodingProfile(max_width=1080, jpeg_quality=75, auto_grayscale=True),
+}
+DEFAULT_ENCODING_PROFILE = ENCODING_PROFILES[OutputProfile.ARCHIVE]
+
+
+@dataclass
+class PageStats:
+    passthrough: int = 0
+    reencoded: int = 0
+
+    @property
+    def total(self) -> int:
+        return self.passthrough + self.reencoded
+
+    def add(self, other: "PageStats") -> None:
+        self.passthrough += other.passthrough
+        self.reencoded += other.reencoded
 
 
 def _natural_chunks(value: str) -> tuple[tuple[int, int | str], ...]:
@@ -30,78 +98,669 @@ def _segment_key(value: str) -> tuple[int, int | tuple[tuple[int, int | str], ..
     return (1, _natural_chunks(value))
 
 
-def _path_sort_key(path: Path, root: Path):
-    rel = path.relative_to(root)
-    key = []
-    for segment in rel.parts[:-1]:
-        key.append(_segment_key(segment))
+@dataclass
+class ImageTree:
+    root: Path
+    pages: list[Path]
+    # 本子目录（第一层）与章节目录（完整相对目录）各自的有序页面
+    albums: dict[str, list[Path]]
+    photos: dict[tuple[str, ...], list[Path]]
+    album_dirs: list[Path]
+
+    def album_pages(self, album_dir: Path) -> list[Path]:
+        return self.albums.get(album_dir.name, [])
+
 
-    stem = Path(rel.parts[-1]).stem
-    key.append(_segment_key(stem))
-    return tuple(key)
+def scan_image_tree(root: Path) -> ImageTree:
+    """
+    Walk `root` once with os.scandir and return its pages in natural order.
+
+    File types come from the directory entries and every sort key is built
+    once, from the parent directory's key plus the file stem.
+    """
+    entries: list[tuple[tuple, str, tuple[str, ...]]] = []
+    top_dirs: list[tuple[tuple, str]] = []
+    stack: list[tuple[str, tuple, tuple[str, ...]]] = [(str(root), (), ())]
+    while stack:
+        directory, dir_key, dir_parts = stack.pop()
+        with os.scandir(directory) as iterator:
+            for entry in iterator:
+                if entry.is_dir():
+                    segment_key = _segment_key(entry.name)
+                    if not dir_parts:
+                        top_dirs.append((segment_key, entry.path))
+                    stack.append((entry.path, dir_key + (segment_key,), dir_parts + (entry.name,)))
+                elif entry.is_file():
+                    stem, suffix = os.path.splitext(entry.name)
+                    if suffix.lower() in SUPPORTED_IMAGE_SUFFIXES:
+                        entries.append((dir_key + (_segment_key(stem),), entry.path, dir_parts))
+
+    entries.sort(key=lambda item: (item[0], item[1]))
+    top_dirs.sort()
+
+    pages: list[Path] = []
+    albums: dict[str, list[Path]] = {}
+    photos: dict[tuple[str, ...], list[Path]] = {}
+    for _key, raw_path, dir_parts in entries:
+        path = Path(raw_path)
+        pages.append(path)
+        if dir_parts:
+            albums.setdefault(dir_parts[0], []).append(path)
+            photos.setdefault(dir_parts, []).append(path)
+
+    return ImageTree(
+        root=root,
+        pages=pages,
+        albums=albums,
+        photos=photos,
+        album_dirs=[Path(raw_path) for _key, raw_path in top_dirs],
+    )
 
 
 def list_images_sorted(root: Path) -> list[Path]:
-    files: list[Path] = []
-    for path in root.rglob("*"):
-        if path.is_file() and path.suffix.lower() in SUPPORTED_IMAGE_SUFFIXES:
-            files.append(path)
-    files.sort(key=lambda p: _path_sort_key(p, root))
-    return files
+    return scan_image_tree(root).pages
+
+
+def _convert_pool_size() -> int:
+    if settings.pdf_convert_workers > 0:
+        return settings.pdf_convert_workers
+    return os.cpu_count() or 1
+
+
+def _get_convert_pool() -> ProcessPoolExecutor | None:
+    global _convert_pool
+    size = _convert_pool_size()
+    if size <= 1:
+        return None
+
+    with _convert_pool_lock:
+        if _convert_pool is None:
+            # 任务线程所在进程是多线程的，fork 后子进程可能继承被占用的锁，这里统一使用 spawn
+            _convert_pool = ProcessPoolExecutor(
+                max_workers=size,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _convert_pool
+
+
+def shutdown_convert_pool(wait: bool = False) -> None:
+    global _convert_pool
+    with _convert_pool_lock:
+        pool = _convert_pool
+        _convert_pool = None
+    if pool is not None:
+        pool.shutdown(wait=wait, cancel_futures=True)
+
+
+def _is_embeddable(image: Image.Image) -> bool:
+    modes = _EMBEDDABLE_MODES.get(image.format or "")
+    if modes is None or image.mode not in modes:
+        return False
+    if image.format == "PNG" and ("transparency" in image.info or image.info.get("interlace")):
+        return False
+    # 带旋转信息的 JPEG 重编码为正向像素，保持与原先输出一致
+    if image.format == "JPEG" and image.getexif().get(_EXIF_ORIENTATION_TAG, 1) != 1:
+        return False
+    return True
+
+
+def _fits_profile(image: Image.Image, profile: EncodingProfile) -> bool:
+    return profile.max_width is None or image.width <= profile.max_width
+
+
+def _is_monochrome(image: Image.Image) -> bool:
+    sample = image.convert("RGB")
+    sample.thumbnail(_GRAYSCALE_SAMPLE_SIZE)
+    red, green, blue = sample.split()
+    spread = max(
+        ImageChops.difference(red, green).getextrema()[1],
+        ImageChops.difference(green, blue).getextrema()[1],
+    )
+    return spread <= _GRAYSCALE_TOLERANCE
+
+
+def _jpeg_quality(image: Image.Image) -> int | None:
+    # 按 libjpeg 的质量缩放公式由亮度量化表估算，无法判断时返回 None
+    tables = getattr(image, "quantization", None)
+    if not tables or 0 not in tables:
+        return None
+    scale = 100 * sum(tables[0]) / _STD_LUMA_QUANT_SUM
+    if scale <= 0:
+        return None
+    return round((200 - scale) / 2) if scale <= 100 else round(5000 / scale)
+
+
+def _should_passthrough(image: Image.Image, profile: EncodingProfile) -> bool:
+    """Whether `image` can go into the output as-is under `profile`, skipping decode and re-encode."""
+    if not _is_embeddable(image) or not _fits_profile(image, profile):
+        return False
+    if profile.lossy:
+        if image.format != "JPEG":
+            return False
+        quality = _jpeg_quality(image)
+        if quality is None or quality > profile.jpeg_quality:
+            return False
+    # 黑白页面检测需要解码，放在只读文件头的判断之后
+    if profile.auto_grayscale and image.mode != "L" and _is_monochrome(image):
+        return False
+    return True
+
+
+def _encode_page(image: Image.Image, target: str | Path, profile: EncodingProfile) -> None:
+    # 按 EXIF 方向转正后再缩放与编码，输出文件不带方向信息
+    image = ImageOps.exif_transpose(image)
+    if image.mode in {"1", "L"} or (profile.auto_grayscale and _is_monochrome(image)):
+        page = image.convert("L")
+    else:
+        page = image.convert("RGB")
+
+    if not _fits_profile(page, profile):
+        height = max(1, round(page.height * profile.max_width / page.width))
+        page = page.resize((profile.max_width, height), Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+    page.save(target, "JPEG", quality=profile.jpeg_quality, dpi=(_BASE_DPI, _BASE_DPI))
+
+
+def prepared_page_path(cache_dir: Path, source_root: Path, source: Path) -> Path:
+    # 转换结果按源文件的相对路径存放，下载期间的流水线与之后的合并阶段共用同一份缓存
+    relative = source.relative_to(source_root)
+    return cache_dir / relative.parent / f"{relative.name}.jpg"
+
+
+def _passthrough_marker(target: str) -> str:
+    # 空标记文件记录“原图直接嵌入”的判定，合并阶段不必再解码检查
+    return f"{os.path.splitext(target)[0]}.pass"
+
+
+def _mark_passthrough(target: str) -> None:
+    with open(_passthrough_marker(target), "wb"):
+        pass
+
+
+def _prepare_page(source: str, target: str, profile: EncodingProfile = DEFAULT_ENCODING_PROFILE) -> tuple[str, bool]:
+    # 之前（流水线或被中断的合并）已转换完成或已判定直接嵌入的页面直接复用
+    if os.path.exists(target):
+        return target, False
+    if os.path.exists(_passthrough_marker(target)):
+        return source, True
+    # 可直接嵌入且符合输出配置的页面不做重编码
+    with Image.open(source) as image:
+        if _should_passthrough(image, profile):
+            _mark_passthrough(target)
+            return source, True
+        # 下载阶段遗留的转换可能与合并阶段同时处理同一页，临时文件按进程区分
+        partial = f"{target}.{os.getpid()}.part"
+        _encode_page(image, partial, profile)
+    os.replace(partial, target)
+    return target, False
+
+
+def _descramble(image: Image.Image, segments: int) -> Image.Image:
+    # 与 jmcomic JmImageTool.decode_and_save 的切片还原算法一致
+    width, height = image.size
+    decoded = Image.new(image.mode, (width, height))
+    over = height % segments
+    for i in range(segments):
+        move = math.floor(height / segments)
+        y_src = height - (move * (i + 1)) - over
+        y_dst = move * i
+        if i == 0:
+            move += over
+        else:
+            y_dst += over
+        decoded.paste(image.crop((0, y_src, width, y_src + move)), (0, y_dst, width, y_dst + move))
+    return decoded
+
+
+def save_descrambled_page(
+    data: bytes,
+    segments: int,
+    target: Path,
+    profile: EncodingProfile = DEFAULT_ENCODING_PROFILE,
+) -> None:
+    """
+    Decode a downloaded (possibly scrambled) page once and write it straight
+    as a PDF-embeddable JPEG in the job's output profile, so the merge stage
+    can embed it without touching the pixels again.
+    """
+    # 先写临时文件再改名，避免中断时留下被 jmcomic 缓存误认为完整的半截文件
+    partial = target.with_name(f"{target.name}.part")
+    with Image.open(BytesIO(data)) as source:
+        keep_bytes = segments == 0 and source.format == "JPEG" and _should_passthrough(source, profile)
+        if keep_bytes:
+            partial.write_bytes(data)
+        else:
+            page = source.convert("L" if source.mode in {"1", "L"} else "RGB")
+            if segments > 0:
+                # 切片按存储方向还原，还原后的新图不带 EXIF，沿用原图的方向信息
+                page = _descramble(page, segments)
+                page.info["exif"] = source.info.get("exif", b"")
+            _encode_page(page, partial, profile)
+    os.replace(partial, target)
+
+
+def _is_intact(path: Path) -> bool:
+    try:
+        with Image.open(path) as image:
+            image_format = image.format
+            image.verify()
+    except Exception:  # noqa: BLE001
+        return False
+    if image_format == "JPEG":
+        # verify() 不检查 JPEG 扫描数据，截断的文件末尾缺少 EOI 标记
+        with path.open("rb") as stream:
+            stream.seek(max(path.stat().st_size - 32, 0))
+            return b"\xff\xd9" in stream.read()
+    return True
+
+
+def discard_broken_pages(root: Path) -> int:
+    """
+    Delete half-written files and pages that fail to parse under `root`, so a
+    resumed download fetches them again instead of trusting jmcomic's
+    file-exists cache. Returns the number of files removed.
+    """
+    removed = 0
+    if not root.exists():
+        return removed
+    for directory, _dirnames, filenames in os.walk(root):
+        for name in filenames:
+            path = Path(directory) / name
+            broken = name.endswith(".part") or (
+                path.suffix.lower() in SUPPORTED_IMAGE_SUFFIXES and not _is_intact(path)
+            )
+            if broken:
+                path.unlink(missing_ok=True)
+                removed += 1
+    return removed
+
+
+def _convert_window() -> int:
+    return min(settings.pdf_convert_workers_per_job, _convert_pool_size())
+
+
+class PageConversionPipeline:
+    """
+    Convert pages in the background while the download is still running.
+
+    submit() is called from jmcomic download threads and never blocks; a
+    dispatcher thread feeds the shared process pool with at most
+    `pdf_convert_workers_per_job` pages in flight for this job. The download
+    stage closes the pipeline instead of waiting for it: pages still queued
+    are left to the merge stage, which reuses whatever was converted.
+    """
+
+    def __init__(
+        self,
+        source_root: Path,
+        cache_dir: Path,
+        profile: EncodingProfile = DEFAULT_ENCODING_PROFILE,
+        cancel_token: CancellationToken | None = None,
+    ) -> None:
+        self._source_root = source_root
+        self._cache_dir = cache_dir
+        self._profile = profile
+        self._pool = _get_convert_pool()
+        self._slots = Semaphore(max(_convert_window(), 1))
+        self._queue: SimpleQueue[tuple[str, str, Future] | None] = SimpleQueue()
+        self._futures: dict[str, Future] = {}
+        self._inner: dict[Future, Future] = {}
+        self._lock = Lock()
+        self._closed = False
+        self._thread: Thread | None = None
+        self._cancel_token = cancel_token
+        if self._pool is not None:
+            self._thread = Thread(target=self._dispatch_loop, name="page-pipeline", daemon=True)
+            self._thread.start()
+            if cancel_token is not None:
+                # 取消时撤回尚未交给转换进程的页面
+                cancel_token.add_callback(self.close)
+
+    def submit(self, source: Path, final: bool = False) -> None:
+        """
+        Queue a saved page for conversion. `final` marks pages the downloader
+        already wrote to match the profile; only the decision is recorded.
+        """
+        if self._pool is None or source.suffix.lower() not in SUPPORTED_IMAGE_SUFFIXES:
+            return
+        try:
+            target = prepared_page_path(self._cache_dir, self._source_root, source)
+        except ValueError:
+            return
+
+        marker = Path(_passthrough_marker(str(target)))
+        if final:
+            ensure_dir(marker.parent)
+            marker.touch()
+            return
+        # 重新保存的页面需要重新判定，旧的标记作废
+        marker.unlink(missing_ok=True)
+
+        key = str(source)
+        with self._lock:
+            if self._closed or key in self._futures:
+                return
+            placeholder: Future = Future()
+            self._futures[key] = placeholder
+        self._queue.put((key, str(target), placeholder))
+
+    def take(self, source: Path) -> Future | None:
+        with self._lock:
+            return self._futures.pop(str(source), None)
+
+    def _dispatch_loop(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            source, target, placeholder = item
+            if not placeholder.set_running_or_notify_cancel():
+                continue
+
+            self._slots.acquire()
+            try:
+                ensure_dir(Path(target).parent)
+                inner = self._pool.submit(_prepare_page, source, target, self._profile)
+            except Exception as exc:  # noqa: BLE001
+                self._slots.release()
+                placeholder.set_exception(exc)
+                continue
+
+            with self._lock:
+                self._inner[placeholder] = inner
+            inner.add_done_callback(lambda done, outer=placeholder: self._forward(outer, done))
+
+    def _forward(self, placeholder: Future, inner: Future) -> None:
+        self._slots.release()
+        with self._lock:
+            self._inner.pop(placeholder, None)
+        if inner.cancelled():
+            placeholder.set_exception(CancelledError())
+            return
+        exc = inner.exception()
+        if exc is not None:
+            placeholder.set_exception(exc)
+        else:
+            placeholder.set_result(inner.result())
+
+    def close(self) -> None:
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            leftovers = list(self._futures.values())
+            inner_futures = list(self._inner.values())
+            self._futures.clear()
 
+        self._queue.put(None)
+        if self._cancel_token is not None:
+            self._cancel_token.remove_callback(self.close)
+        for future in leftovers:
+            future.cancel()
+        for future in inner_futures:
+            future.cancel()
 
-def merge_tree_to_pdf(source_root: Path, output_pdf: Path, temp_dir: Path) -> Path:
+
+@contextmanager
+def _partial_output(path: Path) -> Iterator[Path]:
+    # 先写 <name>.part，完整写完再改名；出错或取消时删除，最终路径上不会留下截断的产物
+    part_path = path.with_name(f"{path.name}.part")
+    try:
+        yield part_path
+        os.replace(part_path, path)
+    except BaseException:
+        part_path.unlink(missing_ok=True)
+        raise
+
+
+def _iter_prepared_pages(
+    tasks: list[tuple[str, str]],
+    profile: EncodingProfile,
+    pipeline: PageConversionPipeline | None = None,
+    cancel_token: CancellationToken | None = None,
+    convert_slots: Semaphore | None = None,
+) -> Iterator[tuple[str, bool]]:
+    pool = _get_convert_pool()
+    window = _convert_window()
+    if pool is None or window <= 1:
+        for source, target in tasks:
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
+            yield _prepare_page(source, target, profile)
+        return
+
+    # 每个任务最多同时占用 window 个转换进程，按页序依次产出，写入端无需等全部完成；
+    # 流水线模式下已在下载期间提交的页面直接复用其结果。
+    # 同一任务并发合并多个本子时共用 convert_slots，整个任务仍只占 window 个进程
+    if convert_slots is None:
+        convert_slots = Semaphore(window)
+    ready: dict[int, tuple[str, bool]] = {}
+    pending: dict[Future, int] = {}
+    next_index = 0
+    submitted = 0
+
+    def _withdraw() -> None:
+        # 进程池中已开始的页面无法中断，最多再转换完 window 页；其余直接撤回
+        for future in list(pending):
+            future.cancel()
+
+    if cancel_token is not None:
+        cancel_token.add_callback(_withdraw)
+    try:
+        while next_index < len(tasks):
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
+            while submitted < len(tasks) and len(pending) < window:
+                # 自己还有页面在转换时不等待额度，避免与同任务的其他本子互相等待
+                if not convert_slots.acquire(blocking=not pending):
+                    break
+                source, target = tasks[submitted]
+                future = pipeline.take(Path(source)) if pipeline is not None else None
+                if future is None:
+                    future = pool.submit(_prepare_page, source, target, profile)
+                    # 转换结束（含被撤回）即归还额度，不必等按页序取走结果
+                    future.add_done_callback(lambda _done: convert_slots.release())
+                else:
+                    # 流水线中的页面已占用下载阶段的转换额度
+                    convert_slots.release()
+                pending[future] = submitted
+                submitted += 1
+
+            if next_index not in ready:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                if cancel_token is not None:
+                    cancel_token.raise_if_cancelled()
+                for future in done:
+                    ready[pending.pop(future)] = future.result()
+
+            while next_index in ready:
+                yield ready.pop(next_index)
+                next_index += 1
+    finally:
+        if cancel_token is not None:
+            cancel_token.remove_callback(_withdraw)
+        for future in pending:
+            future.cancel()
+
+
+def merge_tree_to_pdf(
+    source_root: Path,
+    output_pdf: Path,
+    temp_dir: Path,
+    stats: PageStats | None = None,
+    pipeline: PageConversionPipeline | None = None,
+    profile: EncodingProfile = DEFAULT_ENCODING_PROFILE,
+    images: list[Path] | None = None,
+    cancel_token: CancellationToken | None = None,
+    progress: JobProgress | None = None,
+    convert_slots: Semaphore | None = None,
+) -> Path:
     ensure_dir(temp_dir)
-    images = list_images_sorted(source_root)
+    if images is None:
+        images = list_images_sorted(source_root)
     if not images:
         raise ValueError(f"No images found in {source_root}")
 
-    converted_paths: list[str] = []
-    for index, img_path in enumerate(images, start=1):
-        converted = temp_dir / f"{index:06d}.jpg"
-        with Image.open(img_path) as image:
-            rgb = image.convert("RGB")
-            rgb.save(converted, "JPEG", quality=95)
-        converted_paths.append(str(converted))
-
-    with output_pdf.open("wb") as stream:
-        stream.write(img2pdf.convert(converted_paths))
+    tasks = [(str(img_path), str(prepared_page_path(temp_dir, source_root, img_path))) for img_path in images]
+    for parent in {Path(target).parent for _source, target in tasks}:
+        ensure_dir(parent)
+    with _partial_output(output_pdf) as part_path:
+        with part_path.open("wb") as stream, StreamingPdfWriter(stream) as writer:
+            for path, passthrough in _iter_prepared_pages(tasks, profile, pipeline, cancel_token, convert_slots):
+                writer.add_image(Path(path))
+                if progress is not None:
+                    progress.add_page_merged()
+                if stats is not None:
+                    if passthrough:
+                        stats.passthrough += 1
+                    else:
+                        stats.reencoded += 1
 
     return output_pdf
 
 
+def package_tree_to_cbz(
+    source_root: Path,
+    output_cbz: Path,
+    images: list[Path] | None = None,
+    cancel_token: CancellationToken | None = None,
+    progress: JobProgress | None = None,
+) -> Path:
+    if images is None:
+        images = list_images_sorted(source_root)
+    if not images:
+        raise ValueError(f"No images found in {source_root}")
+
+    # CBZ 直接打包原始页面文件，不做任何解码/编码
+    width = max(len(str(len(images))), 4)
+    with _partial_output(output_cbz) as part_path, zipfile.ZipFile(
+        part_path, "w", compression=zipfile.ZIP_STORED
+    ) as zf:
+        for index, img_path in enumerate(images, start=1):
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
+            zf.write(img_path, f"{index:0{width}d}{img_path.suffix.lower()}")
+            if progress is not None:
+                progress.add_page_merged()
+
+    return output_cbz
+
+
 def build_artifact_from_download(
     source_dir: Path,
     artifact_dir: Path,
     temp_dir: Path,
     job_type: JobType,
     base_name: str,
+    stats: PageStats | None = None,
+    pipeline: PageConversionPipeline | None = None,
+    artifact_format: ArtifactFormat = ArtifactFormat.PDF,
+    profile: EncodingProfile = DEFAULT_ENCODING_PROFILE,
+    cancel_token: CancellationToken | None = None,
+    progress: JobProgress | None = None,
 ) -> tuple[Path, str]:
     ensure_dir(artifact_dir)
     ensure_dir(temp_dir)
 
     safe_base = sanitize_filename(base_name)
+    # 整棵目录只扫描一次，各本子直接复用分组结果
+    tree = scan_image_tree(source_dir)
+    # 与下载阶段的 PageConversionPipeline(source_dir, temp_dir / "pages") 使用相同的缓存布局
+    pages_dir = temp_dir / "pages"
+    if progress is not None:
+        progress.start_merge(len(tree.pages))
 
     if job_type in {JobType.ALBUM, JobType.PHOTO}:
+        if artifact_format == ArtifactFormat.CBZ:
+            target = artifact_dir / f"{safe_base}.cbz"
+            package_tree_to_cbz(source_dir, target, images=tree.pages, cancel_token=cancel_token, progress=progress)
+            return target, target.name
         target = artifact_dir / f"{safe_base}.pdf"
-        merge_tree_to_pdf(source_dir, target, temp_dir / "single")
+        merge_tree_to_pdf(
+            source_dir,
+            target,
+            pages_dir,
+            stats=stats,
+            pipeline=pipeline,
+            profile=profile,
+            images=tree.pages,
+            cancel_token=cancel_token,
+            progress=progress,
+        )
         return target, target.name
 
-    album_dirs = [d for d in source_dir.iterdir() if d.is_dir()]
-    album_dirs.sort(key=lambda p: _segment_key(p.name))
+    album_dirs = tree.album_dirs
     if not album_dirs:
         raise ValueError("No album directories found for multi-album download")
 
-    pdf_paths: list[Path] = []
-    for index, album_dir in enumerate(album_dirs, start=1):
-        pdf_name = f"{index:03d}_{sanitize_filename(album_dir.name)}.pdf"
-        pdf_path = artifact_dir / pdf_name
-        merge_tree_to_pdf(album_dir, pdf_path, temp_dir / f"album_{index:03d}")
-        pdf_paths.append(pdf_path)
-
     zip_path = artifact_dir / f"{safe_base}.zip"
-    with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
-        for pdf_path in pdf_paths:
-            zf.write(pdf_path, pdf_path.name)
+    if artifact_format == ArtifactFormat.CBZ:
+        with _partial_output(zip_path) as part_path, zipfile.ZipFile(
+            part_path, "w", compression=zipfile.ZIP_STORED
+        ) as zf:
+            for index, album_dir in enumerate(album_dirs, start=1):
+                cbz_path = artifact_dir / f"{index:03d}_{sanitize_filename(album_dir.name)}.cbz"
+                package_tree_to_cbz(
+                    album_dir,
+                    cbz_path,
+                    images=tree.album_pages(album_dir),
+                    cancel_token=cancel_token,
+                    progress=progress,
+                )
+                zf.write(cbz_path, cbz_path.name)
+        return zip_path, zip_path.name
+
+    # 各本子并发生成 PDF，哪个先完成就先写入 ZIP；PDF 已是压缩数据，ZIP 只做存储
+    workers = max(1, min(settings.multi_album_build_workers, len(album_dirs)))
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="album-build")
+    convert_slots = Semaphore(max(_convert_window(), 1))
+    try:
+        futures: dict[Future, PageStats] = {}
+        for index, album_dir in enumerate(album_dirs, start=1):
+            pdf_path = artifact_dir / f"{index:03d}_{sanitize_filename(album_dir.name)}.pdf"
+            album_stats = PageStats()
+            future = executor.submit(
+                merge_tree_to_pdf,
+                album_dir,
+                pdf_path,
+                pages_dir / album_dir.name,
+                stats=album_stats,
+                pipeline=pipeline,
+                profile=profile,
+                images=tree.album_pages(album_dir),
+                cancel_token=cancel_token,
+                progress=progress,
+                convert_slots=convert_slots,
+            )
+            futures[future] = album_stats
+
+        with _partial_output(zip_path) as part_path, zipfile.ZipFile(
+            part_path, "w", compression=zipfile.ZIP_STORED
+        ) as zf:
+            for future in as_completed(futures):
+                pdf_path = future.result()
+                zf.write(pdf_path, pdf_path.name)
+                if stats is not None:
+                    stats.add(futures[future])
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
 
     return zip_path, zip_path.name
+
+
+def bundle_album_artifacts(
+    artifacts: list[Path],
+    zip_path: Path,
+    cancel_token: CancellationToken | None = None,
+) -> Path:
+    """Store finished per-album artifacts in one ZIP, numbered in the given order."""
+    ensure_dir(zip_path.parent)
+    # 与单任务 multi_album 产物相同的 001_<本子>.pdf 命名；PDF/CBZ 已是压缩数据，只做存储
+    with _partial_output(zip_path) as part_path, zipfile.ZipFile(
+        part_path, "w", compression=zipfile.ZIP_STORED
+    ) as zf:
+        for index, artifact in enumerate(artifacts, start=1):
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
+            zf.write(artifact, f"{index:03d}_{artifact.name}")
+    return zip_path
@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from threading import Lock, local
+import time
+
+import jmcomic
+
+from backend.app.core.config import settings
+from backend.app.utils.cancellation import CancellationToken
+
+# 延迟滑动平均的权重，越大越看重最近的请求
+_EWMA_ALPHA = 0.3
+
+
+@dataclass
+class _Health:
+    latency: float | None = None
+    successes: int = 0
+    failures: int = 0
+    consecutive_failures: int = 0
+    opened_at: float | None = None
+
+
+@dataclass(frozen=True)
+class HealthSnapshot:
+    impl: str
+    domain: str | None
+    latency_ms: int | None
+    successes: int
+    failures: int
+    consecutive_failures: int
+    circuit_open: bool
+
+
+class HealthTracker:
+    """
+    Latency and failure record of every JM client impl and domain in this
+    process.
+
+    Each request attempt updates an EWMA of its latency; failures count as
+    taking the full JM_TIMEOUT_SECONDS, so flaky domains sort after slow
+    ones. Only measured candidates are reordered; unmeasured ones keep their
+    configured position. After JM_CIRCUIT_FAILURE_THRESHOLD consecutive failures the
+    circuit opens and the candidate is skipped while others are available,
+    until a background probe or a later request succeeds.
+    Impl-wide entries use domain None and aggregate all of its domains.
+    """
+
+    def __init__(self) -> None:
+        self._entries: dict[tuple[str, str | None], _Health] = {}
+        self._lock = Lock()
+
+    def _entry(self, impl: str, domain: str | None) -> _Health:
+        return self._entries.setdefault((impl, domain), _Health())
+
+    def _update(self, health: _Health, ok: bool, latency: float) -> None:
+        health.latency = latency if health.latency is None else (
+            _EWMA_ALPHA * latency + (1 - _EWMA_ALPHA) * health.latency
+        )
+        if ok:
+            health.successes += 1
+            health.consecutive_failures = 0
+            health.opened_at = None
+            return
+        health.failures += 1
+        health.consecutive_failures += 1
+        if health.consecutive_failures >= settings.jm_circuit_failure_threshold:
+            # 半开状态下再次失败会重新计时
+            health.opened_at = time.monotonic()
+
+    def record(self, impl: str, domain: str | None, ok: bool, latency: float) -> None:
+        if not ok:
+            latency = max(latency, float(settings.jm_timeout_seconds))
+        with self._lock:
+            self._update(self._entry(impl, None), ok, latency)
+            if domain is not None:
+                self._update(self._entry(impl, domain), ok, latency)
+
+    def _is_open(self, health: _Health | None) -> bool:
+        if health is None or health.opened_at is None:
+            return False
+        return time.monotonic() - health.opened_at < settings.jm_circuit_open_seconds
+
+    def _order(self, keys: list[tuple[str, str | None]]) -> list[int]:
+        with self._lock:
+            healths = [self._entries.get(key) for key in keys]
+            closed = [index for index, health in enumerate(healths) if not self._is_open(health)]
+            # 只在已测量的候选之间按延迟重排，未测量的留在配置中的位置，
+            # 避免备用项成功一次就排到还没测过的首选项前面
+            measured = [index for index in closed if healths[index] is not None and healths[index].latency is not None]
+            fastest = iter(sorted(measured, key=lambda index: (healths[index].latency, index)))
+            slots = set(measured)
+            closed = [next(fastest) if index in slots else index for index in closed]
+        # 全部熔断时仍按原顺序尝试，不能让请求无处可去
+        return closed or list(range(len(keys)))
+
+    def order_impls(self, impls: list[str]) -> list[str]:
+        if not settings.jm_health_enabled:
+            return impls
+        return [impls[index] for index in self._order([(impl, None) for impl in impls])]
+
+    def order_domains(self, impl: str, domains: list[str]) -> list[str]:
+        if not settings.jm_health_enabled:
+            return domains
+        return [domains[index] for index in self._order([(impl, domain) for domain in domains])]
+
+    def open_circuits(self) -> list[tuple[str, str]]:
+        # 熔断时长已过的也算，它们要靠探测或真实请求成功才会恢复
+        with self._lock:
+            return [
+                (impl, domain)
+                for (impl, domain), health in self._entries.items()
+                if domain is not None and health.opened_at is not None
+            ]
+
+    def snapshot(self) -> list[HealthSnapshot]:
+        with self._lock:
+            return [
+                HealthSnapshot(
+                    impl=impl,
+                    domain=domain,
+                    latency_ms=None if health.latency is None else int(health.latency * 1000),
+                    successes=health.successes,
+                    failures=health.failures,
+                    consecutive_failures=health.consecutive_failures,
+                    circuit_open=self._is_open(health),
+                )
+                for (impl, domain), health in sorted(self._entries.items(), key=lambda item: (item[0][0], item[0][1] or ""))
+            ]
+
+
+health_tracker = HealthTracker()
+_attempt = local()
+
+
+def _tracked_client_class(base: type) -> type:
+    # jmcomic 每次尝试前都会以目标域名调用 update_request_with_specify_domain，
+    # 成功时经过 raise_if_resp_should_retry，失败重试前调用 before_retry；
+    # 不重试（JM_RETRY_TIMES=0）时失败直接抛出，由外层的 request_with_retry 记录。
+    # 同一线程同一时刻只有一个请求，用线程局部变量记录这次尝试，每次尝试只记录一次
+    class TrackedClient(base):
+        def request_with_retry(self, *args, **kwargs):
+            try:
+                return super().request_with_retry(*args, **kwargs)
+            except Exception:
+                self._record_attempt(False)
+                raise
+
+        def update_request_with_specify_domain(self, kwargs, domain, is_image=False):
+            # 在 jmcomic 的重试捕获之外抛出，已被中止的请求不再发起下一次尝试
+            token = getattr(_attempt, "cancel_token", None)
+            if token is not None:
+                token.raise_if_cancelled()
+            super().update_request_with_specify_domain(kwargs, domain, is_image)
+            # 图片走 CDN，不计入域名健康度
+            _attempt.domain = None if is_image else domain
+            _attempt.started_at = time.monotonic()
+
+        def raise_if_resp_should_retry(self, resp):
+            resp = super().raise_if_resp_should_retry(resp)
+            self._record_attempt(True)
+            return resp
+
+        def before_retry(self, e, kwargs, retry_count, url):
+            self._record_attempt(False)
+            super().before_retry(e, kwargs, retry_count, url)
+
+        def _record_attempt(self, ok: bool) -> None:
+            domain = getattr(_attempt, "domain", None)
+            if domain is None:
+                return
+            _attempt.domain = None
+            health_tracker.record(self.client_key, domain, ok, time.monotonic() - _attempt.started_at)
+
+    TrackedClient.__name__ = f"Tracked{base.__name__}"
+    TrackedClient.__qualname__ = TrackedClient.__name__
+    return TrackedClient
+
+
+def bind_request_cancel_token(token: CancellationToken | None) -> None:
+    """Make JM requests on the current thread stop at their next attempt once `token` is cancelled."""
+    _attempt.cancel_token = token
+
+
+def install_client_tracking() -> None:
+    # 替换注册表中的客户端类，搜索等接口与下载任务创建的客户端都会记录健康度
+    for client_class in (jmcomic.JmApiClient, jmcomic.JmHtmlClient):
+        registered = jmcomic.JmModuleConfig.client_impl_class(client_class.client_key)
+        if not registered.__name__.startswith("Tracked"):
+            jmcomic.JmModuleConfig.register_client(_tracked_client_class(registered))
@@ -1,9 +1,16 @@
 from __future__ import annotations
 
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait as wait_futures
+from contextlib import AbstractContextManager, nullcontext
 from dataclasses import dataclass
+from functools import partial
+import hashlib
 from pathlib import Path
 import re
-from typing import Any
+from threading import BoundedSemaphore, Lock
+import time
+from typing import Any, Callable, TypeVar
 
 import jmcomic
 import yaml
@@ -11,11 +18,37 @@ import yaml
 from backend.app.core.config import settings
 from backend.app.models.job import JobType
 from backend.app.schemas.job import SearchResultItem
+from backend.app.services.image_pdf_service import DEFAULT_ENCODING_PROFILE, EncodingProfile, save_descrambled_page
+from backend.app.services.jm_health import bind_request_cancel_token, health_tracker
+from backend.app.services.response_cache import response_cache
+from backend.app.utils.cancellation import CancellationToken, JobCancelledError
 from backend.app.utils.file_utils import ensure_dir
+from backend.app.utils.progress import JobProgress
 
 _ALBUM_PATH_RE = re.compile(r"/album/(\d+)", flags=re.IGNORECASE)
 _PHOTO_PATH_RE = re.compile(r"/photo/(\d+)", flags=re.IGNORECASE)
 
+_image_budget: BoundedSemaphore | None = None
+_image_budget_lock = Lock()
+
+# 对冲请求的线程池，每个交互请求最多同时占用与客户端实现数相同的线程
+_hedge_executor: ThreadPoolExecutor | None = None
+_hedge_slots: BoundedSemaphore | None = None
+_hedge_lock = Lock()
+
+HEDGE_LOST_MESSAGE = "另一个客户端实现已先返回结果"
+
+
+def _image_request_slot() -> AbstractContextManager:
+    # 首次下载时按当前配置创建，独立 worker 进程可在启动前覆盖配置
+    global _image_budget
+    if settings.jm_image_request_budget <= 0:
+        return nullcontext()
+    with _image_budget_lock:
+        if _image_budget is None:
+            _image_budget = BoundedSemaphore(settings.jm_image_request_budget)
+        return _image_budget
+
 
 @dataclass
 class JmCredential:
@@ -23,6 +56,212 @@ class JmCredential:
     password: str
 
 
+T = TypeVar("T")
+
+
+class _ClientPool:
+    """
+    Logged-in JM clients shared by API requests, keyed by user, client impl
+    and a fingerprint of the credential.
+
+    jmcomic clients keep their cookies in the client and are already used
+    from several threads at once by the downloader, so one client per key is
+    shared. Entries expire after JM_CLIENT_TTL_SECONDS and the least recently
+    used ones are evicted beyond JM_CLIENT_POOL_SIZE.
+    """
+
+    def __init__(self) -> None:
+        self._entries: OrderedDict[tuple, tuple[float, Any]] = OrderedDict()
+        self._building: dict[tuple, Lock] = {}
+        self._lock = Lock()
+
+    def _fresh(self, key: tuple) -> Any | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        created_at, client = entry
+        if time.monotonic() - created_at >= settings.jm_client_ttl_seconds:
+            self._entries.pop(key, None)
+            return None
+        self._entries.move_to_end(key)
+        return client
+
+    def get(self, key: tuple, factory: Callable[[], Any]) -> Any:
+        if settings.jm_client_pool_size <= 0 or settings.jm_client_ttl_seconds <= 0:
+            return factory()
+        with self._lock:
+            client = self._fresh(key)
+            if client is not None:
+                return client
+            build_lock = self._building.setdefault(key, Lock())
+        # 同一个键只登录一次，并发请求等待首个请求建好的客户端
+        with build_lock:
+            with self._lock:
+                client = self._fresh(key)
+                if client is not None:
+                    return client
+            try:
+                client = factory()
+            except Exception:
+                with self._lock:
+                    self._building.pop(key, None)
+                raise
+            with self._lock:
+                self._entries[key] = (time.monotonic(), client)
+                while len(self._entries) > settings.jm_client_pool_size:
+                    self._entries.popitem(last=False)
+                self._building.pop(key, None)
+            return client
+
+    def discard(self, key: tuple, client: Any) -> None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] is client:
+                self._entries.pop(key, None)
+
+    def invalidate_user(self, user_id: int) -> None:
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == user_id]:
+                self._entries.pop(key, None)
+
+
+_client_pool = _ClientPool()
+
+
+def _client_key(impl: str, credential: JmCredential | None, user_id: int | None) -> tuple:
+    if credential is None:
+        # 未登录的客户端不带任何用户状态，所有用户共用
+        return (None, impl, None)
+    # 键中只保存凭据摘要；凭据变化后自然换用新客户端，其他进程中的旧客户端也不会被误用
+    digest = hashlib.sha256(f"{credential.username}\0{credential.password}".encode("utf-8")).hexdigest()
+    return (user_id, impl, digest)
+
+
+def _call_with_client(
+    impl: str,
+    credential: JmCredential | None,
+    user_id: int | None,
+    request: Callable[[Any], T],
+) -> T:
+    key = _client_key(impl, credential, user_id)
+    client = _client_pool.get(key, partial(_build_client_by_impl, impl, credential))
+    domain_list = _domains_for_impl(impl)
+    if domain_list:
+        # 复用的客户端按最新的健康度调整域名顺序，不再先耗在已熔断的域名上
+        client.domain_list = domain_list
+    try:
+        return request(client)
+    except JobCancelledError:
+        # 对冲请求中落败的一方被中止，客户端本身没有问题
+        raise
+    except Exception:
+        # 登录态失效或域名不可用时丢弃，下次请求重新创建并登录
+        _client_pool.discard(key, client)
+        raise
+
+
+def invalidate_jm_clients(user_id: int) -> None:
+    _client_pool.invalidate_user(user_id)
+
+
+class JobDownloader(jmcomic.JmDownloader):
+    """
+    jmcomic downloader that reports every saved image, so pages can be
+    processed while later chapters are still downloading.
+
+    Once the job's cancellation token is set it stops scheduling chapters and
+    pages; requests already in flight finish, nothing new is fetched.
+
+    Image requests of all jobs in the process share JM_IMAGE_REQUEST_BUDGET
+    slots; descrambling and encoding run after the slot is released.
+    """
+
+    def __init__(
+        self,
+        option,
+        on_image_saved: Callable[[Path, bool], None] | None = None,
+        profile: EncodingProfile = DEFAULT_ENCODING_PROFILE,
+        cancel_token: CancellationToken | None = None,
+        progress: JobProgress | None = None,
+    ) -> None:
+        super().__init__(option)
+        self._on_image_saved = on_image_saved
+        self._profile = profile
+        self._cancel_token = cancel_token
+        self._progress = progress
+
+    def _cancelled(self) -> bool:
+        return self._cancel_token is not None and self._cancel_token.cancelled
+
+    def do_filter(self, detail):
+        # 返回空列表时 jmcomic 不再为剩余的章节/页面启动下载线程
+        if self._cancelled():
+            return []
+        return super().do_filter(detail)
+
+    def before_photo(self, photo):
+        super().before_photo(photo)
+        # 章节详情获取后才知道页数，总数随下载推进逐步增长
+        if self._progress is not None and not photo.skip:
+            self._progress.add_images_total(len(photo))
+
+    def _image_ready(self, path: Path, final: bool = False) -> None:
+        if self._progress is not None:
+            try:
+                size = path.stat().st_size
+            except OSError:
+                size = 0
+            self._progress.add_image(size)
+        if self._on_image_saved is not None:
+            self._on_image_saved(path, final)
+
+    @jmcomic.catch_exception
+    def download_by_image_detail(self, image):
+        # 同一章节的页面已全部派发给下载线程，取消后逐页跳过
+        if self._cancelled():
+            return
+        try:
+            return self._download_image(image)
+        except Exception:
+            if self._progress is not None:
+                self._progress.add_error()
+            raise
+
+    def _download_image(self, image):
+        img_save_path = self.option.decide_image_filepath(image)
+        image.save_path = img_save_path
+        image.exists = jmcomic.file_exists(img_save_path)
+
+        self.before_image(image, img_save_path)
+        if image.skip:
+            return
+        if self.option.decide_download_cache(image) is True and image.exists:
+            # 续传时已存在的页面也交给流水线，合并阶段可以直接使用转换结果
+            self._image_ready(Path(img_save_path))
+            return
+
+        if not self.option.decide_download_image_decode(image):
+            # 动图等不需要解密的图片按 jmcomic 的方式原样保存；
+            # 直接调用客户端，失败只由本方法的 catch_exception 记录一次
+            with _image_request_slot():
+                self.client.download_by_image_detail(image, img_save_path, decode_image=False)
+            self.after_image(image, img_save_path)
+            self._image_ready(Path(img_save_path))
+            return
+
+        # 解密与编码合并为一次：原图解码 → 还原切片 → 直接写成 PDF 可嵌入的 JPEG
+        with _image_request_slot():
+            resp = self.client.get_jm_image(image.download_url)
+        resp.require_success()
+        # 与 jmcomic 一致，切片数按不带查询参数的图片地址计算
+        segments = jmcomic.JmImageTool.get_num_by_url(image.scramble_id, image.img_url)
+        save_descrambled_page(resp.content, segments, Path(img_save_path), self._profile)
+
+        self.after_image(image, img_save_path)
+        # 写出的页面已按输出配置判定过，流水线只需记录结果
+        self._image_ready(Path(img_save_path), final=True)
+
+
 def _split_csv(value: str | None) -> list[str]:
     if not value:
         return []
@@ -41,15 +280,18 @@ def _impl_order() -> list[str]:
 
     if not order:
         order = ["api", "html"]
-    return order
+    return health_tracker.order_impls(order)
 
 
 def _domains_for_impl(impl: str) -> list[str]:
+    # 未配置时使用 jmcomic 的内置域名，以便按健康度排序；网页端域名尚未获取时仍交给 jmcomic 在线获取
     if impl == "html":
-        return _split_csv(settings.jm_html_domains)
-    if impl == "api":
-        return _split_csv(settings.jm_api_domains)
-    return []
+        domains = _split_csv(settings.jm_html_domains) or list(jmcomic.JmModuleConfig.DOMAIN_HTML_LIST or [])
+    elif impl == "api":
+        domains = _split_csv(settings.jm_api_domains) or list(jmcomic.JmModuleConfig.DOMAIN_API_LIST)
+    else:
+        return []
+    return health_tracker.order_domains(impl, domains)
 
 
 def _meta_data_args() -> dict[str, Any]:
@@ -85,7 +327,23 @@ def _normalize_photo_id(value: str) -> str:
     return text
 
 
-def build_option_file(base_dir: Path, option_file: Path, credential: JmCredential | None, client_impl: str) -> None:
+def download_threading(image_threads: int | None = None, photo_threads: int | None = None) -> dict[str, int]:
+    image = max(1, image_threads or settings.jm_image_threads)
+    photo = max(1, photo_threads or settings.jm_photo_threads)
+    budget = settings.jm_image_request_budget
+    if budget > 0:
+        # 超出全局预算的线程只会排队等待，没有意义
+        image = min(image, budget)
+    return {"image": image, "photo": photo}
+
+
+def build_option_file(
+    base_dir: Path,
+    option_file: Path,
+    credential: JmCredential | None,
+    client_impl: str,
+    threads: dict[str, int] | None = None,
+) -> None:
     ensure_dir(base_dir)
     ensure_dir(option_file.parent)
 
@@ -116,7 +374,9 @@ def build_option_file(base_dir: Path, option_file: Path, credential: JmCredentia
             "cache": True,
             "image": {
                 "decode": True,
+                "suffix": ".jpg",
             },
+            "threading": threads or download_threading(),
         },
     }
 
@@ -163,6 +423,22 @@ def _build_client_by_impl(impl: str, credential: JmCredential | None):
     return client
 
 
+def probe_open_circuits() -> None:
+    """Send one cheap request to every domain with an open circuit so it can recover."""
+    for impl, domain in health_tracker.open_circuits():
+        try:
+            option = jmcomic.JmOption.default()
+            option.client.retry_times = 0
+            client = option.new_jm_client(impl=impl, domain_list=[domain], **_meta_data_args())
+            if impl == "api":
+                client.setting()
+            else:
+                client.get_jm_html("/")
+        except Exception:  # noqa: BLE001
+            # 成功与失败都已由客户端记录
+            pass
+
+
 def verify_login(credential: JmCredential) -> bool:
     errors: list[str] = []
     for impl in _impl_order():
@@ -176,96 +452,228 @@ def verify_login(credential: JmCredential) -> bool:
     raise RuntimeError("; ".join(errors))
 
 
-def search_album(keyword: str, page: int, credential: JmCredential | None) -> list[SearchResultItem]:
-    errors: list[str] = []
-    for impl in _impl_order():
-        try:
-            client = _build_client_by_impl(impl, credential)
-            search_page = client.search_site(search_query=keyword, page=page)
+def _cached_items(
+    namespace: str,
+    parts: tuple,
+    ttl_seconds: int,
+    load: Callable[[], list[SearchResultItem]],
+) -> list[SearchResultItem]:
+    cached = response_cache.get_or_load(
+        namespace,
+        parts,
+        ttl_seconds,
+        lambda: [item.model_dump() for item in load()],
+    )
+    return [SearchResultItem(**item) for item in cached]
 
-            if hasattr(search_page, "iter_id_title"):
-                iterator = search_page.iter_id_title()
-            else:
-                iterator = iter(search_page)
 
-            results: list[SearchResultItem] = []
-            for aid, title in iterator:
-                results.append(SearchResultItem(album_id=str(aid), title=str(title)))
-            return results
-        except Exception as exc:  # noqa: BLE001
-            errors.append(f"{impl}: {exc}")
-    raise RuntimeError("; ".join(errors))
+def search_album(
+    keyword: str,
+    page: int,
+    credential: JmCredential | None,
+    user_id: int | None = None,
+) -> list[SearchResultItem]:
+    # 同一关键词的结果对所有用户相同
+    return _cached_items(
+        "search",
+        (keyword.strip(), page),
+        settings.search_cache_ttl_seconds,
+        lambda: _search_album_upstream(keyword, page, credential, user_id),
+    )
 
 
-def fetch_favorites(page: int, credential: JmCredential) -> list[SearchResultItem]:
-    errors: list[str] = []
-    for impl in _impl_order():
-        try:
-            client = _build_client_by_impl(impl, credential)
-            favorite_page = client.favorite_folder(page=page)
-            if hasattr(favorite_page, "iter_id_title"):
-                iterator = favorite_page.iter_id_title()
-            else:
-                iterator = iter(favorite_page)
+def fetch_favorites(page: int, credential: JmCredential, user_id: int | None = None) -> list[SearchResultItem]:
+    # 带上 JM 用户名，更换账号后不会读到旧账号的收藏夹
+    return _cached_items(
+        "favorites",
+        (user_id, credential.username, page),
+        settings.favorites_cache_ttl_seconds,
+        lambda: _fetch_favorites_upstream(page, credential, user_id),
+    )
 
-            items: list[SearchResultItem] = []
-            for aid, title in iterator:
-                items.append(SearchResultItem(album_id=str(aid), title=str(title)))
-            return items
-        except Exception as exc:  # noqa: BLE001
-            errors.append(f"{impl}: {exc}")
-    raise RuntimeError("; ".join(errors))
+
+def fetch_ranking(page: int, credential: JmCredential | None, user_id: int | None = None) -> list[SearchResultItem]:
+    return _cached_items(
+        "ranking",
+        ("week", page),
+        settings.ranking_cache_ttl_seconds,
+        lambda: _fetch_ranking_upstream(page, credential, user_id),
+    )
+
+
+def _items_from_page(page_result) -> list[SearchResultItem]:
+    iterator = page_result.iter_id_title() if hasattr(page_result, "iter_id_title") else iter(page_result)
+    return [SearchResultItem(album_id=str(aid), title=str(title)) for aid, title in iterator]
 
 
-def fetch_ranking(page: int, credential: JmCredential | None) -> list[SearchResultItem]:
+def _search_album_upstream(
+    keyword: str,
+    page: int,
+    credential: JmCredential | None,
+    user_id: int | None,
+) -> list[SearchResultItem]:
+    return _first_success(
+        lambda impl: _items_from_page(
+            _call_with_client(
+                impl,
+                credential,
+                user_id,
+                lambda client: client.search_site(search_query=keyword, page=page),
+            )
+        )
+    )
+
+
+def _fetch_favorites_upstream(page: int, credential: JmCredential, user_id: int | None) -> list[SearchResultItem]:
+    return _first_success(
+        lambda impl: _items_from_page(
+            _call_with_client(impl, credential, user_id, lambda client: client.favorite_folder(page=page))
+        )
+    )
+
+
+def _fetch_ranking_upstream(page: int, credential: JmCredential | None, user_id: int | None) -> list[SearchResultItem]:
+    return _first_success(
+        lambda impl: _items_from_page(
+            _call_with_client(impl, credential, user_id, lambda client: client.week_ranking(page))
+        )
+    )
+
+
+def _first_success(request: Callable[[str], T]) -> T:
+    impls = _impl_order()
+    if settings.jm_hedge_enabled and len(impls) > 1:
+        return _hedged_request(impls, request)
     errors: list[str] = []
-    for impl in _impl_order():
+    for impl in impls:
         try:
-            client = _build_client_by_impl(impl, credential)
-            ranking_page = client.week_ranking(page)
-            iterator = ranking_page.iter_id_title() if hasattr(ranking_page, "iter_id_title") else iter(ranking_page)
-            results: list[SearchResultItem] = []
-            for aid, title in iterator:
-                results.append(SearchResultItem(album_id=str(aid), title=str(title)))
-            return results
+            return request(impl)
         except Exception as exc:  # noqa: BLE001
             errors.append(f"{impl}: {exc}")
     raise RuntimeError("; ".join(errors))
 
 
+def _hedge_pool() -> tuple[ThreadPoolExecutor, BoundedSemaphore]:
+    global _hedge_executor, _hedge_slots
+    with _hedge_lock:
+        if _hedge_executor is None:
+            # 与接口层共用 JM_UPSTREAM_CONCURRENCY 额度，同时发出的上游请求（含备用请求）不超过该值
+            size = max(1, settings.jm_upstream_concurrency)
+            _hedge_slots = BoundedSemaphore(size)
+            _hedge_executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix="jm-hedge")
+        return _hedge_executor, _hedge_slots
+
+
+def _hedged_attempt(token: CancellationToken, request: Callable[[str], T], impl: str) -> T:
+    bind_request_cancel_token(token)
+    try:
+        return request(impl)
+    finally:
+        bind_request_cancel_token(None)
+
+
+def _hedged_request(impls: list[str], request: Callable[[str], T]) -> T:
+    """
+    Try impls in health order, but start the next one as soon as the current
+    ones have not answered within JM_HEDGE_DELAY_MS or have all failed. The
+    first success wins; the others stop before their next request attempt.
+    """
+    token = CancellationToken()
+    remaining = list(impls)
+    pending: dict[Future, str] = {}
+    errors: dict[str, str] = {}
+
+    def launch(block: bool) -> None:
+        executor, slots = _hedge_pool()
+        # 额度用满时不发起备用请求，下一个延迟周期再试；其他实现全部失败时才等待额度
+        if not slots.acquire(blocking=block):
+            return
+        impl = remaining.pop(0)
+        future = executor.submit(_hedged_attempt, token, request, impl)
+        future.add_done_callback(lambda _done: slots.release())
+        pending[future] = impl
+
+    launch(True)
+    try:
+        while pending:
+            # 没有备用实现可发起时一直等到有结果
+            timeout = settings.jm_hedge_delay_ms / 1000 if remaining else None
+            done, _not_done = wait_futures(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                launch(False)
+                continue
+            for future in done:
+                impl = pending.pop(future)
+                try:
+                    return future.result()
+                except Exception as exc:  # noqa: BLE001
+                    errors[impl] = str(exc)
+            if not pending and remaining:
+                launch(True)
+    finally:
+        token.cancel(HEDGE_LOST_MESSAGE)
+        for future in pending:
+            future.cancel()
+    raise RuntimeError("; ".join(f"{impl}: {errors[impl]}" for impl in impls if impl in errors))
+
+
 def run_download_job(
     job_type: JobType,
     payload: dict[str, Any],
     source_dir: Path,
     option_file: Path,
     credential: JmCredential | None,
+    on_image_saved: Callable[[Path, bool], None] | None = None,
+    profile: EncodingProfile = DEFAULT_ENCODING_PROFILE,
+    cancel_token: CancellationToken | None = None,
+    progress: JobProgress | None = None,
+    image_threads: int | None = None,
+    photo_threads: int | None = None,
 ) -> None:
+    # jmcomic 以 downloader(option) 的方式实例化下载器，批量下载时每个本子各建一个
+    downloader = partial(
+        JobDownloader,
+        on_image_saved=on_image_saved,
+        profile=profile,
+        cancel_token=cancel_token,
+        progress=progress,
+    )
+    threads = download_threading(image_threads, photo_threads)
     errors: list[str] = []
     for impl in _impl_order():
+        if cancel_token is not None:
+            # 被取消的下载会跳过剩余页面后正常返回，由调用方检查令牌；出错时也不必再换实现重试
+            cancel_token.raise_if_cancelled()
+        if progress is not None:
+            progress.reset_download()
         try:
-            build_option_file(source_dir, option_file, credential, impl)
+            build_option_file(source_dir, option_file, credential, impl, threads)
             option = jmcomic.create_option_by_file(str(option_file))
 
             if job_type == JobType.ALBUM:
                 album_id = _normalize_album_id(str(payload["id_value"]))
-                jmcomic.download_album(album_id, option)
+                jmcomic.download_album(album_id, option, downloader)
                 return
 
             if job_type == JobType.PHOTO:
                 photo_id = _normalize_photo_id(str(payload["id_value"]))
-                jmcomic.download_photo(photo_id, option)
+                jmcomic.download_photo(photo_id, option, downloader)
                 return
 
             if job_type == JobType.MULTI_ALBUM:
                 raw_ids = payload.get("album_ids") or []
                 ids = [_normalize_album_id(str(value)) for value in raw_ids]
-                jmcomic.download_album(ids, option)
+                jmcomic.download_album(ids, option, downloader)
                 return
 
             raise ValueError(f"Unsupported job_type: {job_type}")
         except Exception as exc:  # noqa: BLE001
             errors.append(f"{impl}: {exc}")
+            if progress is not None:
+                progress.add_error()
 
+    if cancel_token is not None:
+        cancel_token.raise_if_cancelled()
     raise RuntimeError("; ".join(errors))
 
 
@@ -6,12 +6,24 @@ from datetime import datetime, timedelta, timezone
 from pathlib import Path
 
 from fastapi import HTTPException, status
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 
-from backend.app.models.job import DownloadJob, JobStatus, JobType
+from backend.app.models.job import ArtifactFormat, DownloadJob, JobStatus, JobType, OutputProfile
 from backend.app.models.user import User, UserRole
 from backend.app.utils.file_utils import safe_remove_path
 
+# 尚未结束的任务状态，计入进行中的配额并可被中止
+IN_PROGRESS_STATUSES = frozenset(
+    {
+        JobStatus.QUEUED,
+        JobStatus.RUNNING,
+        JobStatus.WAITING,
+        JobStatus.DOWNLOADED,
+        JobStatus.MERGING,
+    }
+)
+
 _ALBUM_PATH_RE = re.compile(r"/album/(\d+)", flags=re.IGNORECASE)
 _PHOTO_PATH_RE = re.compile(r"/photo/(\d+)", flags=re.IGNORECASE)
 
@@ -105,7 +117,8 @@ def count_user_album_units(
     statuses: set[JobStatus] | None = None,
     window_minutes: int | None = None,
 ) -> int:
-    query = db.query(DownloadJob).filter(DownloadJob.user_id == user_id)
+    # 拆分出的单本子任务已由父任务计数
+    query = db.query(DownloadJob).filter(DownloadJob.user_id == user_id, DownloadJob.parent_job_id.is_(None))
     if statuses:
         query = query.filter(DownloadJob.status.in_(statuses))
 
@@ -123,10 +136,23 @@ def count_user_album_units(
     return total
 
 
-def create_job(db: Session, user: User, job_type: JobType, payload: dict) -> DownloadJob:
+def create_job(
+    db: Session,
+    user: User,
+    job_type: JobType,
+    payload: dict,
+    artifact_format: ArtifactFormat = ArtifactFormat.PDF,
+    output_profile: OutputProfile = OutputProfile.ARCHIVE,
+    image_threads: int | None = None,
+    photo_threads: int | None = None,
+) -> DownloadJob:
     job = DownloadJob(
         user_id=user.id,
         job_type=job_type,
+        artifact_format=artifact_format,
+        output_profile=output_profile,
+        image_threads=image_threads,
+        photo_threads=photo_threads,
         payload_json=json.dumps(normalize_payload_for_job(job_type, payload), ensure_ascii=False),
         status=JobStatus.QUEUED,
     )
@@ -136,16 +162,26 @@ def create_job(db: Session, user: User, job_type: JobType, payload: dict) -> Dow
     return job
 
 
-def find_reusable_job_for_user(db: Session, user: User, job_type: JobType, payload: dict) -> DownloadJob | None:
+def find_reusable_job_for_user(
+    db: Session,
+    user: User,
+    job_type: JobType,
+    payload: dict,
+    artifact_format: ArtifactFormat = ArtifactFormat.PDF,
+    output_profile: OutputProfile = OutputProfile.ARCHIVE,
+) -> DownloadJob | None:
     target_signature = _payload_signature(job_type, payload)
     if target_signature == (job_type.value, ""):
         return None
 
-    candidate_statuses = {JobStatus.QUEUED, JobStatus.RUNNING, JobStatus.MERGING, JobStatus.DONE}
+    candidate_statuses = IN_PROGRESS_STATUSES | {JobStatus.DONE}
     query = (
         db.query(DownloadJob)
         .filter(DownloadJob.user_id == user.id)
+        .filter(DownloadJob.parent_job_id.is_(None))
         .filter(DownloadJob.job_type == job_type)
+        .filter(DownloadJob.artifact_format == artifact_format)
+        .filter(DownloadJob.output_profile == output_profile)
         .filter(DownloadJob.status.in_(candidate_statuses))
         .order_by(DownloadJob.id.desc())
     )
@@ -159,10 +195,11 @@ def find_reusable_job_for_user(db: Session, user: User, job_type: JobType, paylo
         if _payload_signature(job_type, existing_payload) != target_signature:
             continue
 
-        if job.status in {JobStatus.QUEUED, JobStatus.RUNNING, JobStatus.MERGING}:
+        if job.status in IN_PROGRESS_STATUSES:
             return job
 
-        if job.status == JobStatus.DONE:
+        # 部分本子失败的 multi_album 结果不复用，让用户可以重新下载完整内容
+        if job.status == JobStatus.DONE and not job.error_message:
             expires_at = _ensure_utc(job.expires_at)
             if expires_at is not None and expires_at > now and job.download_token and job.result_file_path:
                 return job
@@ -170,11 +207,118 @@ def find_reusable_job_for_user(db: Session, user: User, job_type: JobType, paylo
     return None
 
 
-def list_jobs_for_user(db: Session, user: User) -> list[DownloadJob]:
-    query = db.query(DownloadJob)
+def _visible_jobs_query(db: Session, user: User, *columns):
+    query = db.query(*columns) if columns else db.query(DownloadJob)
+    query = query.filter(DownloadJob.parent_job_id.is_(None))
     if user.role != UserRole.ADMIN:
         query = query.filter(DownloadJob.user_id == user.id)
-    return query.order_by(DownloadJob.id.desc()).all()
+    return query
+
+
+def list_jobs_for_user(db: Session, user: User) -> list[DownloadJob]:
+    return _visible_jobs_query(db, user).order_by(DownloadJob.id.desc()).all()
+
+
+def job_change_stamps(db: Session, user: User) -> dict[int, tuple]:
+    """
+    A cheap fingerprint of every job listed for `user`: it changes whenever
+    the job row or any of its album jobs is updated.
+    """
+    stamps = {
+        job_id: (updated_at,)
+        for job_id, updated_at in _visible_jobs_query(db, user, DownloadJob.id, DownloadJob.updated_at).all()
+    }
+    if not stamps:
+        return stamps
+    child_rows = (
+        db.query(DownloadJob.parent_job_id, func.max(DownloadJob.updated_at), func.count(DownloadJob.id))
+        .filter(DownloadJob.parent_job_id.in_(list(stamps)))
+        .group_by(DownloadJob.parent_job_id)
+        .all()
+    )
+    for parent_id, child_updated_at, child_count in child_rows:
+        stamps[parent_id] = (*stamps[parent_id], child_updated_at, child_count)
+    return stamps
+
+
+def job_activity_by_user(db: Session, user_ids: set[int] | None = None) -> dict[int, tuple]:
+    """
+    (latest updated_at, job count) per user, album jobs included; it changes
+    whenever any of the user's job stamps would. None covers every user.
+    """
+    query = db.query(DownloadJob.user_id, func.max(DownloadJob.updated_at), func.count(DownloadJob.id))
+    if user_ids is not None:
+        if not user_ids:
+            return {}
+        query = query.filter(DownloadJob.user_id.in_(user_ids))
+    return {user_id: (updated_at, count) for user_id, updated_at, count in query.group_by(DownloadJob.user_id).all()}
+
+
+def list_child_jobs(db: Session, job: DownloadJob) -> list[DownloadJob]:
+    return db.query(DownloadJob).filter(DownloadJob.parent_job_id == job.id).order_by(DownloadJob.id).all()
+
+
+def count_child_jobs_by_status(db: Session, parent_ids: list[int]) -> dict[int, dict[JobStatus, int]]:
+    if not parent_ids:
+        return {}
+    rows = (
+        db.query(DownloadJob.parent_job_id, DownloadJob.status, func.count(DownloadJob.id))
+        .filter(DownloadJob.parent_job_id.in_(parent_ids))
+        .group_by(DownloadJob.parent_job_id, DownloadJob.status)
+        .all()
+    )
+    result: dict[int, dict[JobStatus, int]] = {}
+    for parent_id, job_status, count in rows:
+        result.setdefault(parent_id, {})[job_status] = count
+    return result
+
+
+def sum_child_progress(db: Session, parent_ids: list[int]) -> dict[int, dict[str, int]]:
+    if not parent_ids:
+        return {}
+    rows = (
+        db.query(
+            DownloadJob.parent_job_id,
+            func.sum(DownloadJob.images_total),
+            func.sum(DownloadJob.images_done),
+            func.sum(DownloadJob.bytes_downloaded),
+            func.sum(DownloadJob.pages_merged),
+            func.sum(DownloadJob.pages_passthrough),
+            func.sum(DownloadJob.pages_reencoded),
+        )
+        .filter(DownloadJob.parent_job_id.in_(parent_ids))
+        .group_by(DownloadJob.parent_job_id)
+        .all()
+    )
+    return {
+        parent_id: {
+            "images_total": int(images_total or 0),
+            "images_done": int(images_done or 0),
+            "bytes_downloaded": int(bytes_downloaded or 0),
+            "pages_merged": int(pages_merged or 0),
+            "pages_passthrough": int(pages_passthrough or 0),
+            "pages_reencoded": int(pages_reencoded or 0),
+        }
+        for (
+            parent_id,
+            images_total,
+            images_done,
+            bytes_downloaded,
+            pages_merged,
+            pages_passthrough,
+            pages_reencoded,
+        ) in rows
+    }
+
+
+def remove_job_files(job: DownloadJob) -> None:
+    if job.result_file_path:
+        artifact_dir = Path(job.result_file_path).parent
+        safe_remove_path(artifact_dir)
+    if job.source_dir:
+        source_dir = Path(job.source_dir)
+        safe_remove_path(source_dir)
+        safe_remove_path(source_dir.parent)
 
 
 def get_job_for_user(db: Session, user: User, job_id: int) -> DownloadJob:
@@ -198,7 +342,11 @@ def get_job_by_token(db: Session, token: str) -> DownloadJob:
 def clear_failed_expired_jobs_for_user(db: Session, user: User) -> int:
     target_statuses = {JobStatus.FAILED, JobStatus.EXPIRED, JobStatus.CLEANED}
 
-    query = db.query(DownloadJob).filter(DownloadJob.status.in_(target_statuses))
+    query = (
+        db.query(DownloadJob)
+        .filter(DownloadJob.status.in_(target_statuses))
+        .filter(DownloadJob.parent_job_id.is_(None))
+    )
     if user.role != UserRole.ADMIN:
         query = query.filter(DownloadJob.user_id == user.id)
 
@@ -207,13 +355,12 @@ def clear_failed_expired_jobs_for_user(db: Session, user: User) -> int:
         return 0
 
     for job in jobs:
-        if job.result_file_path:
-            artifact_dir = Path(job.result_file_path).parent
-            safe_remove_path(artifact_dir)
-        if job.source_dir:
-            source_dir = Path(job.source_dir)
-            safe_remove_path(source_dir)
-            safe_remove_path(source_dir.parent)
+        # 父任务已结束，子任务不会再被认领，随父任务一起删除
+        for child in list_child_jobs(db, job):
+            remove_job_files(child)
+            db.delete(child)
+        db.flush()
+        remove_job_files(job)
         db.delete(job)
 
     db.commit()
@@ -244,13 +391,7 @@ def expire_and_cleanup_jobs(db: Session) -> None:
     )
 
     for job in cleanup_jobs:
-        if job.result_file_path:
-            artifact_dir = Path(job.result_file_path).parent
-            safe_remove_path(artifact_dir)
-        if job.source_dir:
-            source_dir = Path(job.source_dir)
-            safe_remove_path(source_dir)
-            safe_remove_path(source_dir.parent)
+        remove_job_files(job)
 
         job.status = JobStatus.CLEANED
         job.download_token = None
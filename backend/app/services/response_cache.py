@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta, timezone
+import hashlib
+import json
+from threading import Lock
+import time
+from typing import Any, Callable, Protocol
+
+from sqlalchemy.orm import Session
+
+from backend.app.core.config import settings
+from backend.app.db.session import SessionLocal
+from backend.app.models.cache import CachedResponse
+
+# 合并等待的上限为 JM_TIMEOUT_SECONDS 的倍数，进行中的请求卡住时等待方改为自行请求
+_WAIT_TIMEOUT_FACTOR = 2
+
+
+class CacheBackend(Protocol):
+    name: str
+
+    def get(self, key: str) -> Any | None: ...
+
+    def set(self, key: str, value: Any, ttl_seconds: int) -> None: ...
+
+
+class MemoryCacheBackend:
+    """Bounded LRU cache local to this process."""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int) -> None:
+        self._max_entries = max(1, max_entries)
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key: str) -> Any | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                self._entries.pop(key, None)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl_seconds: int) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+
+class DatabaseCacheBackend:
+    """
+    Cache stored in the response_cache table, shared by every API process
+    using the same database. Read or write failures count as a miss.
+    """
+
+    name = "database"
+
+    def get(self, key: str) -> Any | None:
+        db = SessionLocal()
+        try:
+            row = db.get(CachedResponse, key)
+            if row is None:
+                return None
+            expires_at = row.expires_at
+            if expires_at.tzinfo is None:
+                expires_at = expires_at.replace(tzinfo=timezone.utc)
+            if expires_at <= datetime.now(timezone.utc):
+                return None
+            return json.loads(row.value_json)
+        except Exception:  # noqa: BLE001
+            return None
+        finally:
+            db.close()
+
+    def set(self, key: str, value: Any, ttl_seconds: int) -> None:
+        db = SessionLocal()
+        try:
+            db.merge(
+                CachedResponse(
+                    cache_key=key,
+                    value_json=json.dumps(value, ensure_ascii=False),
+                    expires_at=datetime.now(timezone.utc) + timedelta(seconds=ttl_seconds),
+                )
+            )
+            db.commit()
+        except Exception:  # noqa: BLE001
+            # 多个进程同时写入同一个键时以先写入的为准
+            db.rollback()
+        finally:
+            db.close()
+
+
+@dataclass
+class _NamespaceStats:
+    hits: int = 0
+    misses: int = 0
+    coalesced: int = 0
+    errors: int = 0
+    wait_timeouts: int = 0
+
+
+class ResponseCache:
+    """
+    TTL cache for upstream JM responses, keyed by namespace (endpoint) and
+    request arguments.
+
+    Concurrent misses for the same key within this process share one
+    upstream request; the others wait for its result, or its error, which
+    is never cached. A waiter that gets no answer within a bounded time
+    calls the loader itself. Values must be JSON-serializable.
+    """
+
+    def __init__(self) -> None:
+        self._backend: CacheBackend | None = None
+        self._backend_ready = False
+        self._lock = Lock()
+        self._inflight: dict[str, Future] = {}
+        self._stats: dict[str, _NamespaceStats] = {}
+
+    def _get_backend(self) -> CacheBackend | None:
+        # 首次使用时按当前配置创建
+        with self._lock:
+            if not self._backend_ready:
+                kind = (settings.response_cache_backend or "").strip().lower()
+                if kind == "memory":
+                    self._backend = MemoryCacheBackend(settings.response_cache_max_entries)
+                elif kind == "database":
+                    self._backend = DatabaseCacheBackend()
+                self._backend_ready = True
+            return self._backend
+
+    def _namespace_stats(self, namespace: str) -> _NamespaceStats:
+        return self._stats.setdefault(namespace, _NamespaceStats())
+
+    def get_or_load(self, namespace: str, parts: tuple, ttl_seconds: int, loader: Callable[[], Any]) -> Any:
+        backend = self._get_backend()
+        if backend is None or ttl_seconds <= 0:
+            return loader()
+
+        digest = hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode("utf-8")).hexdigest()
+        key = f"{namespace}:{digest}"
+        value = backend.get(key)
+        with self._lock:
+            stats = self._namespace_stats(namespace)
+            if value is not None:
+                stats.hits += 1
+                return value
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+                stats.misses += 1
+            else:
+                stats.coalesced += 1
+        if not owner:
+            try:
+                return future.result(timeout=settings.jm_timeout_seconds * _WAIT_TIMEOUT_FACTOR)
+            except FutureTimeoutError:
+                with self._lock:
+                    stats.wait_timeouts += 1
+                value = loader()
+                backend.set(key, value, ttl_seconds)
+                return value
+
+        try:
+            value = loader()
+        except Exception as exc:
+            with self._lock:
+                stats.errors += 1
+                self._inflight.pop(key, None)
+            future.set_exception(exc)
+            raise
+        backend.set(key, value, ttl_seconds)
+        with self._lock:
+            self._inflight.pop(key, None)
+        future.set_result(value)
+        return value
+
+    def stats(self) -> dict[str, Any]:
+        backend = self._get_backend()
+        with self._lock:
+            namespaces = {namespace: asdict(stats) for namespace, stats in self._stats.items()}
+        return {"backend": backend.name if backend is not None else "none", "namespaces": namespaces}
+
+
+response_cache = ResponseCache()
+
+
+def purge_expired_responses(db: Session) -> int:
+    deleted = (
+        db.query(CachedResponse)
+        .filter(CachedResponse.expires_at <= datetime.now(timezone.utc))
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    return deleted or 0
@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+from collections.abc import Callable
+from threading import Event, Lock
+
+
+class JobCancelledError(Exception):
+    pass
+
+
+class CancellationToken:
+    """
+    Cooperative cancellation flag shared by everything working on one job.
+
+    Long-running code checks it between units of work (one page, one file)
+    instead of being interrupted, so a cancelled job stops within one page
+    and never in the middle of a write. Callbacks let owners of queued work,
+    such as process pool futures, withdraw it as soon as the job is cancelled.
+    """
+
+    def __init__(self) -> None:
+        self._event = Event()
+        self._lock = Lock()
+        self._callbacks: list[Callable[[], None]] = []
+        self.reason = ""
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str) -> bool:
+        with self._lock:
+            if self._event.is_set():
+                return False
+            self.reason = reason
+            self._event.set()
+            callbacks = self._callbacks
+            self._callbacks = []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:  # noqa: BLE001
+                pass
+        return True
+
+    def raise_if_cancelled(self) -> None:
+        if self._event.is_set():
+            raise JobCancelledError(self.reason)
+
+    def add_callback(self, callback: Callable[[], None]) -> None:
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def remove_callback(self, callback: Callable[[], None]) -> None:
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
@@ -0,0 +1,212 @@
+from __future__ import annotations
+
+import shutil
+import struct
+from pathlib import Path
+from typing import BinaryIO
+
+from PIL import Image
+
+DEFAULT_DPI = 96
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+_PNG_COLOR_CHANNELS = {0: 1, 2: 3}
+_COLORSPACE_BY_CHANNELS = {1: "/DeviceGray", 3: "/DeviceRGB"}
+_COPY_BUFFER_SIZE = 1024 * 1024
+
+
+def _format_number(value: float) -> str:
+    text = f"{value:.4f}".rstrip("0").rstrip(".")
+    return text or "0"
+
+
+def _png_chunks(stream: BinaryIO):
+    if stream.read(8) != _PNG_SIGNATURE:
+        raise ValueError("Invalid PNG signature")
+    while True:
+        header = stream.read(8)
+        if len(header) < 8:
+            raise ValueError("Truncated PNG stream")
+        length, chunk_type = struct.unpack(">I4s", header)
+        yield chunk_type, length
+        if chunk_type == b"IEND":
+            return
+
+
+class StreamingPdfWriter:
+    """
+    Append image pages to a PDF stream one at a time.
+
+    Every page is laid out at DEFAULT_DPI whatever DPI the file declares, so
+    directly embedded and re-encoded pages of the same pixel size get the
+    same page size.
+
+    Only JPEG (DCTDecode) and non-interlaced grayscale/RGB PNG (FlateDecode)
+    inputs are supported; image data is copied from disk in fixed-size chunks,
+    so memory use does not grow with the page count.
+    """
+
+    _CATALOG_ID = 1
+    _PAGES_ID = 2
+
+    def __init__(self, stream: BinaryIO) -> None:
+        self._stream = stream
+        self._offsets: dict[int, int] = {}
+        self._page_ids: list[int] = []
+        self._next_id = 3
+        self._closed = False
+        self._write(b"%PDF-1.5\n%\xbf\xf7\xa2\xfe\n")
+
+    def __enter__(self) -> "StreamingPdfWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+
+    @property
+    def page_count(self) -> int:
+        return len(self._page_ids)
+
+    def _write(self, data: bytes) -> None:
+        self._stream.write(data)
+
+    def _allocate_id(self) -> int:
+        object_id = self._next_id
+        self._next_id += 1
+        return object_id
+
+    def _begin_object(self, object_id: int) -> None:
+        self._offsets[object_id] = self._stream.tell()
+        self._write(f"{object_id} 0 obj\n".encode("ascii"))
+
+    def _write_object(self, object_id: int, body: str) -> None:
+        self._begin_object(object_id)
+        self._write(f"{body}\nendobj\n".encode("ascii"))
+
+    def _write_stream_object(self, object_id: int, header: str, length: int, copy_body) -> None:
+        self._begin_object(object_id)
+        self._write(f"<< {header} /Length {length} >>\nstream\n".encode("ascii"))
+        copy_body()
+        self._write(b"\nendstream\nendobj\n")
+
+    def _write_jpeg(self, object_id: int, path: Path, width: int, height: int, channels: int) -> None:
+        size = path.stat().st_size
+        header = (
+            f"/Type /XObject /Subtype /Image /Width {width} /Height {height} "
+            f"/ColorSpace {_COLORSPACE_BY_CHANNELS[channels]} /BitsPerComponent 8 /Filter /DCTDecode"
+        )
+
+        def copy_body() -> None:
+            with path.open("rb") as source:
+                shutil.copyfileobj(source, self._stream, _COPY_BUFFER_SIZE)
+
+        self._write_stream_object(object_id, header, size, copy_body)
+
+    def _write_png(self, object_id: int, path: Path) -> None:
+        with path.open("rb") as source:
+            idat_total = 0
+            width = height = depth = channels = 0
+            for chunk_type, length in _png_chunks(source):
+                if chunk_type == b"IHDR":
+                    width, height, depth, color_type, _comp, _filter, interlace = struct.unpack(
+                        ">IIBBBBB", source.read(13)
+                    )
+                    source.seek(4, 1)
+                    if color_type not in _PNG_COLOR_CHANNELS or interlace:
+                        raise ValueError(f"Unsupported PNG layout for direct embedding: {path}")
+                    channels = _PNG_COLOR_CHANNELS[color_type]
+                    continue
+                if chunk_type == b"IDAT":
+                    idat_total += length
+                source.seek(length + 4, 1)
+
+            if not channels:
+                raise ValueError(f"PNG header missing: {path}")
+
+            header = (
+                f"/Type /XObject /Subtype /Image /Width {width} /Height {height} "
+                f"/ColorSpace {_COLORSPACE_BY_CHANNELS[channels]} /BitsPerComponent {depth} /Filter /FlateDecode "
+                f"/DecodeParms << /Predictor 15 /Colors {channels} /BitsPerComponent {depth} /Columns {width} >>"
+            )
+
+            def copy_body() -> None:
+                # 第二遍只拷贝 IDAT 数据块，PNG 的 zlib 流可直接作为 FlateDecode 内容
+                source.seek(0)
+                for chunk_type, length in _png_chunks(source):
+                    if chunk_type != b"IDAT":
+                        source.seek(length + 4, 1)
+                        continue
+                    remaining = length
+                    while remaining:
+                        block = source.read(min(remaining, _COPY_BUFFER_SIZE))
+                        if not block:
+                            raise ValueError(f"Truncated PNG stream: {path}")
+                        self._write(block)
+                        remaining -= len(block)
+                    source.seek(4, 1)
+
+            self._write_stream_object(object_id, header, idat_total, copy_body)
+
+    def add_image(self, path: Path) -> None:
+        if self._closed:
+            raise RuntimeError("PDF writer already closed")
+
+        with Image.open(path) as image:
+            image_format = image.format
+            mode = image.mode
+            width, height = image.size
+
+        start = self._stream.tell()
+        image_id = self._allocate_id()
+        try:
+            if image_format == "JPEG" and mode in {"RGB", "L"}:
+                self._write_jpeg(image_id, path, width, height, 1 if mode == "L" else 3)
+            elif image_format == "PNG":
+                self._write_png(image_id, path)
+            else:
+                raise ValueError(f"Unsupported image for direct embedding: {path} ({image_format} {mode})")
+        except Exception:
+            # 拒绝的页面还没写出任何内容时收回对象编号，xref 不会留下空洞，写入端可以继续使用
+            if self._stream.tell() == start:
+                self._next_id = image_id
+            raise
+
+        page_width = 72.0 * width / DEFAULT_DPI
+        page_height = 72.0 * height / DEFAULT_DPI
+        content = (
+            f"q\n{_format_number(page_width)} 0 0 {_format_number(page_height)} 0 0 cm\n/Im0 Do\nQ"
+        ).encode("ascii")
+
+        content_id = self._allocate_id()
+        self._begin_object(content_id)
+        self._write(f"<< /Length {len(content)} >>\nstream\n".encode("ascii") + content + b"\nendstream\nendobj\n")
+
+        page_id = self._allocate_id()
+        self._write_object(
+            page_id,
+            (
+                f"<< /Type /Page /Parent {self._PAGES_ID} 0 R "
+                f"/MediaBox [0 0 {_format_number(page_width)} {_format_number(page_height)}] "
+                f"/Resources << /XObject << /Im0 {image_id} 0 R >> >> /Contents {content_id} 0 R >>"
+            ),
+        )
+        self._page_ids.append(page_id)
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        if not self._page_ids:
+            raise ValueError("PDF has no pages")
+
+        kids = " ".join(f"{page_id} 0 R" for page_id in self._page_ids)
+        self._write_object(self._PAGES_ID, f"<< /Type /Pages /Kids [{kids}] /Count {len(self._page_ids)} >>")
+        self._write_object(self._CATALOG_ID, f"<< /Type /Catalog /Pages {self._PAGES_ID} 0 R >>")
+
+        xref_offset = self._stream.tell()
+        size = self._next_id
+        lines = [f"xref\n0 {size}\n", "0000000000 65535 f \n"]
+        for object_id in range(1, size):
+            lines.append(f"{self._offsets[object_id]:010d} 00000 n \n")
+        lines.append(f"trailer\n<< /Size {size} /Root {self._CATALOG_ID} 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n")
+        self._write("".join(lines).encode("ascii"))
+        self._closed = True
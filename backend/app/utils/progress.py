@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+from threading import Lock
+
+
+class JobProgress:
+    """
+    Progress counters of one running job.
+
+    Download threads and the merge loop update it in memory; the worker
+    writes changed counters to the job row in batches, so progress never
+    costs a database round-trip per page.
+    """
+
+    def __init__(
+        self,
+        images_total: int = 0,
+        images_done: int = 0,
+        bytes_downloaded: int = 0,
+        pages_merged: int = 0,
+    ) -> None:
+        self._lock = Lock()
+        self._dirty = False
+        self.images_total = images_total
+        self.images_done = images_done
+        self.bytes_downloaded = bytes_downloaded
+        self.pages_merged = pages_merged
+        # 上游失败（图片或整次请求）次数，只在内存中供并发调节使用，不写入数据库
+        self.errors = 0
+
+    def reset_download(self) -> None:
+        # 换用另一种客户端实现重新下载时重新计数，已存在的页面会再次计入
+        with self._lock:
+            self.images_total = 0
+            self.images_done = 0
+            self.bytes_downloaded = 0
+            self._dirty = True
+
+    def add_images_total(self, count: int) -> None:
+        with self._lock:
+            self.images_total += count
+            self._dirty = True
+
+    def add_image(self, size: int) -> None:
+        with self._lock:
+            self.images_done += 1
+            self.bytes_downloaded += size
+            self._dirty = True
+
+    def add_error(self) -> None:
+        with self._lock:
+            self.errors += 1
+
+    def start_merge(self, pages_total: int) -> None:
+        # 合并前以实际扫描到的页数为准
+        with self._lock:
+            self.images_total = pages_total
+            self.pages_merged = 0
+            self._dirty = True
+
+    def add_page_merged(self) -> None:
+        with self._lock:
+            self.pages_merged += 1
+            self._dirty = True
+
+    def values(self) -> dict[str, int]:
+        with self._lock:
+            return self._values()
+
+    def take_changes(self) -> dict[str, int] | None:
+        """Return the counters if they changed since the last call."""
+        with self._lock:
+            if not self._dirty:
+                return None
+            self._dirty = False
+            return self._values()
+
+    def _values(self) -> dict[str, int]:
+        return {
+            "images_total": self.images_total,
+            "images_done": self.images_done,
+            "bytes_downloaded": self.bytes_downloaded,
+            "pages_merged": self.pages_merged,
+        }
@@ -0,0 +1,117 @@
+"""
+Standalone job worker: `python -m backend.app.workers`.
+
+Runs job execution and the cleanup scheduler without the web API. Set
+EMBEDDED_WORKER_ENABLED=false on the API processes so that they only enqueue
+and read jobs; any number of workers can share the database queue.
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import signal
+import sys
+from threading import Event
+
+from backend.app.core.config import settings
+from backend.app.core.runtime import prepare_runtime
+from backend.app.services.image_pdf_service import shutdown_convert_pool
+from backend.app.workers.job_runner import (
+    WORKER_ID,
+    current_download_limit,
+    recover_unfinished_jobs,
+    start_job_worker,
+    stop_job_worker,
+)
+from backend.app.workers.scheduler import (
+    start_cleanup_scheduler,
+    start_health_probe,
+    stop_cleanup_scheduler,
+    stop_health_probe,
+)
+
+# 以 -m 运行时 __name__ 是 "__main__"，按包名取 logger 才能按名称配置与过滤
+logger = logging.getLogger("backend.app.workers")
+
+
+def _parse_args(argv: list[str] | None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m backend.app.workers", description="Run JM Web download jobs")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=None,
+        help=f"jobs downloading in parallel in this process (default: MAX_PARALLEL_JOBS={settings.max_parallel_jobs})",
+    )
+    parser.add_argument(
+        "--merge-concurrency",
+        type=int,
+        default=None,
+        help=f"jobs merging in parallel in this process (default: MAX_PARALLEL_MERGES={settings.max_parallel_merges})",
+    )
+    parser.add_argument(
+        "--convert-workers",
+        type=int,
+        default=None,
+        help=f"page conversion processes (default: PDF_CONVERT_WORKERS={settings.pdf_convert_workers}, 0 = CPU count)",
+    )
+    parser.add_argument("--no-cleanup", action="store_true", help="do not run the expired job cleanup scheduler")
+    parser.add_argument(
+        "--log-level",
+        default="INFO",
+        type=str.upper,
+        choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+        help="logging level of the worker process (default: INFO)",
+    )
+    parser.add_argument(
+        "--no-drain",
+        action="store_true",
+        help="exit right away on SIGTERM instead of finishing the jobs already running",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = _parse_args(argv)
+    logging.basicConfig(level=args.log_level, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    if args.concurrency is not None:
+        settings.max_parallel_jobs = max(1, args.concurrency)
+    if args.merge_concurrency is not None:
+        settings.max_parallel_merges = max(1, args.merge_concurrency)
+    if args.convert_workers is not None:
+        settings.pdf_convert_workers = max(0, args.convert_workers)
+
+    prepare_runtime()
+    recover_unfinished_jobs()
+    start_job_worker()
+    start_health_probe()
+    if not args.no_cleanup:
+        start_cleanup_scheduler()
+    downloads = str(current_download_limit())
+    if settings.adaptive_concurrency_enabled:
+        downloads += f" (adaptive {settings.adaptive_min_parallel_jobs}-{settings.adaptive_max_parallel_jobs})"
+    logger.info("worker %s started, downloads=%s, merges=%s", WORKER_ID, downloads, settings.max_parallel_merges)
+
+    stop_requested = Event()
+
+    def _request_stop(_signum, _frame) -> None:
+        # 第一次信号停止认领并排空，第二次直接退出
+        if stop_requested.is_set():
+            raise SystemExit(1)
+        stop_requested.set()
+
+    signal.signal(signal.SIGTERM, _request_stop)
+    signal.signal(signal.SIGINT, _request_stop)
+    while not stop_requested.wait(1):
+        pass
+
+    logger.info("worker %s stopping", WORKER_ID)
+    stop_cleanup_scheduler()
+    stop_health_probe()
+    stop_job_worker(wait=not args.no_drain)
+    shutdown_convert_pool()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import os
+import time
+from dataclasses import dataclass
+from threading import Lock
+
+from backend.app.core.config import settings
+from backend.app.utils.progress import JobProgress
+
+# 加一个并发后吞吐至少提升该比例才保留
+_MIN_GAIN = 0.05
+# 收缩或试探失败后保持若干个周期不再加并发，避免来回抖动
+_HOLD_INTERVALS = 3
+
+
+@dataclass(frozen=True)
+class ThroughputSample:
+    bytes_per_second: float
+    error_rate: float
+    cpu_load: float
+    saturated: bool
+
+
+def cpu_load() -> float:
+    # 每个 CPU 的 1 分钟平均负载；平台不支持时返回 0，不参与调节
+    try:
+        load = os.getloadavg()[0]
+    except (AttributeError, OSError):
+        return 0.0
+    return load / (os.cpu_count() or 1)
+
+
+class DownloadMeter:
+    """
+    Turns the cumulative counters of running download jobs into totals per
+    sampling interval. Jobs that finish between two samples are retired with
+    their last counters so their final pages are still counted.
+    """
+
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self._seen: dict[int, tuple[int, int, int]] = {}
+        self._pending = (0, 0, 0)
+        self._sampled_at = time.monotonic()
+
+    def _delta(self, job_id: int, progress: JobProgress) -> tuple[int, int, int]:
+        current = (progress.bytes_downloaded, progress.images_done, progress.errors)
+        last = self._seen.get(job_id, (0, 0, 0))
+        self._seen[job_id] = current
+        # 换用另一种客户端实现时计数会清零，此时从零重新累计
+        return tuple(now - before if now >= before else now for now, before in zip(current, last))
+
+    def retire(self, job_id: int, progress: JobProgress) -> None:
+        with self._lock:
+            delta = self._delta(job_id, progress)
+            self._seen.pop(job_id, None)
+            self._pending = tuple(a + b for a, b in zip(self._pending, delta))
+
+    def sample(self, active: dict[int, JobProgress]) -> tuple[float, float]:
+        """Return bytes per second and the error rate since the last sample."""
+        with self._lock:
+            totals = self._pending
+            for job_id, progress in active.items():
+                totals = tuple(a + b for a, b in zip(totals, self._delta(job_id, progress)))
+            for job_id in set(self._seen) - set(active):
+                self._seen.pop(job_id, None)
+            self._pending = (0, 0, 0)
+            now = time.monotonic()
+            elapsed = max(now - self._sampled_at, 1e-6)
+            self._sampled_at = now
+        size, images, errors = totals
+        attempts = images + errors
+        return size / elapsed, (errors / attempts if attempts else 0.0)
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD limit for the number of jobs downloading at once in this process.
+
+    The limit halves when the upstream error rate or the CPU load crosses its
+    threshold. While every slot is busy it grows by one per interval, and an
+    increase that did not raise the throughput is undone, so the limit stays
+    at the point where more parallel downloads stop paying off.
+    """
+
+    def __init__(self, minimum: int, maximum: int, initial: int) -> None:
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self._limit = min(self.maximum, max(self.minimum, initial))
+        # 上一次加并发之前的吞吐，下个周期据此判断是否保留
+        self._probe_bps: float | None = None
+        self._hold = 0
+        self._lock = Lock()
+
+    @property
+    def limit(self) -> int:
+        with self._lock:
+            return self._limit
+
+    def update(self, sample: ThroughputSample) -> int:
+        with self._lock:
+            overloaded = (
+                sample.error_rate > settings.adaptive_error_rate_threshold
+                or sample.cpu_load > settings.adaptive_cpu_load_threshold
+            )
+            if overloaded:
+                self._limit = max(self.minimum, self._limit // 2)
+                self._probe_bps = None
+                self._hold = _HOLD_INTERVALS
+            elif self._probe_bps is not None:
+                if sample.bytes_per_second < self._probe_bps * (1 + _MIN_GAIN):
+                    self._limit = max(self.minimum, self._limit - 1)
+                    self._hold = _HOLD_INTERVALS
+                self._probe_bps = None
+            elif self._hold > 0:
+                self._hold -= 1
+            elif sample.saturated and self._limit < self.maximum:
+                self._probe_bps = sample.bytes_per_second
+                self._limit += 1
+            return self._limit
@@ -1,33 +1,61 @@
 from __future__ import annotations
 
-import ctypes
 import json
+import os
 import secrets
-from concurrent.futures import Future, ThreadPoolExecutor
+import socket
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor, wait as wait_futures
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
-from threading import Lock, get_ident
+from pathlib import Path
+from threading import Event, Lock, Thread
+
+from sqlalchemy import func, or_, update
 
 from backend.app.core.config import settings
 from backend.app.db.session import SessionLocal
-from backend.app.models.job import DownloadJob, JobStatus
-from backend.app.models.user import User
+from backend.app.models.job import ArtifactFormat, DownloadJob, JobStatus, JobType
+from backend.app.models.user import User, UserRole
 from backend.app.services.crypto_service import decrypt_text
-from backend.app.services.image_pdf_service import build_artifact_from_download
+from backend.app.services.image_pdf_service import (
+    ENCODING_PROFILES,
+    PageConversionPipeline,
+    PageStats,
+    build_artifact_from_download,
+    bundle_album_artifacts,
+    discard_broken_pages,
+)
 from backend.app.services.jm_service import JmCredential, artifact_base_name, run_download_job
-from backend.app.utils.file_utils import ensure_dir, safe_remove_path
-
-_executor = ThreadPoolExecutor(max_workers=settings.max_parallel_jobs)
-_inflight_jobs: set[int] = set()
-_futures: dict[int, Future] = {}
-_thread_ids: dict[int, int] = {}
-_cancel_requested: set[int] = set()
+from backend.app.utils.cancellation import CancellationToken, JobCancelledError
+from backend.app.utils.file_utils import ensure_dir, safe_remove_path, sanitize_filename
+from backend.app.utils.progress import JobProgress
+from backend.app.workers.concurrency import AdaptiveConcurrency, DownloadMeter, ThroughputSample, cpu_load
+
+# 每个进程一个唯一的工作者标识，用于认领任务租约
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{secrets.token_hex(4)}"
+
+_executors: dict[str, ThreadPoolExecutor] = {}
+# job_id -> (阶段名, Future)
+_active_jobs: dict[int, tuple[str, Future]] = {}
+_cancel_tokens: dict[int, CancellationToken] = {}
+_job_progress: dict[int, JobProgress] = {}
+# 启用自适应并发时由它决定同时下载的任务数
+_download_limit: AdaptiveConcurrency | None = None
+_download_meter = DownloadMeter()
 _lock = Lock()
+_wake_event = Event()
+_stop_event = Event()
+_worker_threads: list[Thread] = []
 
-CANCELLED_MESSAGE = "任务已由用户中止"
+_ACTIVE_STATUSES = (JobStatus.RUNNING, JobStatus.MERGING)
+_UNFINISHED_STATUSES = (JobStatus.QUEUED, JobStatus.RUNNING, JobStatus.DOWNLOADED, JobStatus.MERGING)
 
-
-class JobCancelledError(Exception):
-    pass
+CANCELLED_MESSAGE = "任务已由用户中止"
+LEASE_EXPIRED_MESSAGE = "任务所在的工作进程多次中断，已标记为失败，请重新创建任务。"
+ALBUMS_FAILED_MESSAGE = "以下本子下载失败，未包含在压缩包中："
+# 公平调度只比较这段时间内的认领时间
+_FAIR_SHARE_WINDOW = timedelta(hours=6)
 
 
 def cleanup_job_artifacts(job_id: int) -> None:
@@ -35,51 +63,51 @@ def cleanup_job_artifacts(job_id: int) -> None:
     safe_remove_path(settings.download_root / f"job_{job_id}")
 
 
-def _is_cancel_requested(job_id: int) -> bool:
-    with _lock:
-        return job_id in _cancel_requested
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
 
 
-def _raise_async_exception(thread_id: int, exc_type: type[BaseException]) -> bool:
-    result = ctypes.pythonapi.PyThreadState_SetAsyncExc(  # type: ignore[attr-defined]
-        ctypes.c_ulong(thread_id),
-        ctypes.py_object(exc_type),
-    )
-    if result == 0:
-        return False
-    if result > 1:
-        ctypes.pythonapi.PyThreadState_SetAsyncExc(  # type: ignore[attr-defined]
-            ctypes.c_ulong(thread_id),
-            ctypes.py_object(None),
-        )
+def request_cancel(job_id: int) -> bool:
+    """
+    Cancel a job running in this process. Jobs claimed by other workers are
+    cancelled through the database status, which they check every
+    JOB_PROGRESS_FLUSH_SECONDS.
+
+    The job's token is only flagged; the download and conversion loops check
+    it between pages, so the job stops within one page of work.
+    """
+    with _lock:
+        _stage_name, future = _active_jobs.get(job_id, (None, None))
+        token = _cancel_tokens.get(job_id)
+    if future is None or token is None:
         return False
+    if future.cancel():
+        return True
+    token.cancel(CANCELLED_MESSAGE)
     return True
 
 
-def request_cancel(job_id: int) -> bool:
+def _finalize_job_tracking(job_id: int, future: Future) -> None:
     with _lock:
-        future = _futures.get(job_id)
-        thread_id = _thread_ids.get(job_id)
-        # 仅对真正存在中的任务设置取消标记，避免“孤立取消标记”污染后续复用的任务ID
-        if future is None and thread_id is None:
-            return False
-        _cancel_requested.add(job_id)
-
-    if future is not None and future.cancel():
-        return True
+        # 下载阶段收尾时同一任务可能已被本进程认领进入合并阶段，只清理属于自己的记录
+        if _active_jobs.get(job_id, (None, None))[1] is future:
+            _active_jobs.pop(job_id, None)
+            _cancel_tokens.pop(job_id, None)
+    # 腾出并发槽位后立即尝试认领下一个任务
+    _wake_event.set()
 
-    if thread_id is not None:
-        return _raise_async_exception(thread_id, JobCancelledError)
 
-    return False
+def job_held_by_worker(job: DownloadJob) -> bool:
+    """
+    Whether a worker, possibly in another process, is executing `job`. Such a
+    worker removes the job's files itself once it sees the cancellation, so
+    callers must not delete directories it may still be writing to.
+    """
+    return job.status in _ACTIVE_STATUSES and job.lease_owner is not None and job.lease_expires_at is not None
 
 
-def _finalize_job_tracking(job_id: int) -> None:
-    with _lock:
-        _inflight_jobs.discard(job_id)
-        _futures.pop(job_id, None)
-        _thread_ids.pop(job_id, None)
-        _cancel_requested.discard(job_id)
+def _is_cancelled(status: JobStatus, error_message: str | None) -> bool:
+    return status == JobStatus.FAILED and (error_message or "").startswith(CANCELLED_MESSAGE)
 
 
 def _job_marked_cancelled_in_db(db, job_id: int) -> bool:
@@ -87,155 +115,813 @@ def _job_marked_cancelled_in_db(db, job_id: int) -> bool:
     job = db.query(DownloadJob).filter(DownloadJob.id == job_id).first()
     if job is None:
         return False
-    return job.status == JobStatus.FAILED and (job.error_message or "").startswith(CANCELLED_MESSAGE)
+    if job.lease_owner != WORKER_ID:
+        # 租约已被回收，继续执行会覆盖接手方写入的状态
+        return True
+    return _is_cancelled(job.status, job.error_message)
 
 
-def _ensure_not_cancelled(job_id: int, db=None) -> None:
-    if _is_cancel_requested(job_id):
-        raise JobCancelledError(CANCELLED_MESSAGE)
-    if db is not None and _job_marked_cancelled_in_db(db, job_id):
+def _checkpoint(db, job_id: int, token: CancellationToken) -> None:
+    # 阶段边界（写入结果之前）才查一次库；逐页的检查只看本地令牌，由进度线程把库中的取消同步到令牌
+    token.raise_if_cancelled()
+    if _job_marked_cancelled_in_db(db, job_id):
         raise JobCancelledError(CANCELLED_MESSAGE)
 
 
-def recover_unfinished_jobs() -> None:
+@dataclass(frozen=True)
+class _JobPaths:
+    temp_dir: Path
+    source_dir: Path
+    option_file: Path
+    artifact_dir: Path
+    pdf_temp_dir: Path
+
+    @classmethod
+    def for_job(cls, job_id: int) -> "_JobPaths":
+        temp_dir = settings.temp_root / f"job_{job_id}"
+        return cls(
+            temp_dir=temp_dir,
+            source_dir=temp_dir / "source",
+            option_file=temp_dir / "option.yml",
+            artifact_dir=settings.download_root / f"job_{job_id}",
+            pdf_temp_dir=temp_dir / "pdf_tmp",
+        )
+
+
+@dataclass(frozen=True)
+class _Stage:
     """
-    Recover persisted jobs after backend restart:
-    - mark interrupted running/merging jobs as failed
-    - re-enqueue queued jobs
+    One step of a job. A worker claims jobs in `waiting` status, runs them as
+    `active` on the stage's own thread pool, and the stage hands the job on by
+    writing the next waiting status.
     """
-    db = SessionLocal()
-    queued_ids: list[int] = []
+
+    name: str
+    waiting: JobStatus
+    active: JobStatus
+    run: Callable[..., None]
+    slots_setting: str
+
+    @property
+    def slots(self) -> int:
+        return max(1, getattr(settings, self.slots_setting))
+
+
+def _claim_candidates(db, stage: _Stage) -> list[int]:
+    """
+    Pick the oldest job of every user waiting for `stage` and order them
+    fair-share style: users with fewer jobs active in the stage first, then
+    users served least recently, so one user with a long queue cannot hold
+    every slot while others wait. Admins go first if ADMIN_JOB_PRIORITY is
+    set, and users at USER_MAX_RUNNING_JOBS are skipped.
+    """
+    heads = (
+        db.query(func.min(DownloadJob.id), DownloadJob.user_id, User.role)
+        .join(User, User.id == DownloadJob.user_id)
+        .filter(DownloadJob.status == stage.waiting)
+        .group_by(DownloadJob.user_id, User.role)
+        .all()
+    )
+    if not heads:
+        return []
+    user_ids = [user_id for _job_id, user_id, _role in heads]
+
+    running = dict(
+        db.query(DownloadJob.user_id, func.count(DownloadJob.id))
+        .filter(DownloadJob.status == stage.active, DownloadJob.user_id.in_(user_ids))
+        .group_by(DownloadJob.user_id)
+        .all()
+    )
+    # 运行数相同时，最久没有被认领过任务的用户优先，形成轮转；
+    # 只看有任务排队的用户最近一段时间的认领记录，窗口之前的视同从未认领
+    last_claimed = dict(
+        db.query(DownloadJob.user_id, func.max(DownloadJob.claimed_at))
+        .filter(
+            DownloadJob.user_id.in_(user_ids),
+            DownloadJob.claimed_at >= _utcnow() - _FAIR_SHARE_WINDOW,
+        )
+        .group_by(DownloadJob.user_id)
+        .all()
+    )
+
+    cap = settings.user_max_running_jobs
+    ranked: list[tuple[tuple, int]] = []
+    for job_id, user_id, role in heads:
+        running_count = running.get(user_id, 0)
+        # 上限按认领时的快照判断，多个 worker 同时认领时可能短暂超出一个
+        if cap > 0 and running_count >= cap:
+            continue
+        priority = 0 if settings.admin_job_priority and role == UserRole.ADMIN else 1
+        claimed_at = last_claimed.get(user_id)
+        recency = (0,) if claimed_at is None else (1, claimed_at)
+        ranked.append(((priority, running_count, recency, job_id), job_id))
+    ranked.sort()
+    return [job_id for _key, job_id in ranked]
+
+
+def _claim_next_job(db, stage: _Stage) -> int | None:
+    """
+    Atomically move one job from the stage's waiting status to its active
+    status under this worker's lease.
+
+    The conditional UPDATE only matches while the row is still waiting, so when
+    several workers race for the same job exactly one of them sees rowcount 1.
+    """
+    for job_id in _claim_candidates(db, stage):
+        now = _utcnow()
+        values = {
+            "status": stage.active,
+            "error_message": None,
+            "lease_owner": WORKER_ID,
+            "lease_expires_at": now + timedelta(seconds=settings.job_lease_seconds),
+            "heartbeat_at": now,
+            "claimed_at": now,
+            "updated_at": now,
+        }
+        if stage.waiting == JobStatus.QUEUED:
+            values["attempts"] = DownloadJob.attempts + 1
+        result = db.execute(
+            update(DownloadJob)
+            .where(DownloadJob.id == job_id, DownloadJob.status == stage.waiting)
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        if result.rowcount == 1:
+            return job_id
+    return None
+
+
+def _expire_stale_leases(db) -> int:
+    """
+    Hand jobs whose worker stopped renewing its lease back to the queue:
+    interrupted downloads go back to QUEUED and resume from the pages already
+    on disk, interrupted merges go back to DOWNLOADED. Jobs that have been
+    interrupted JOB_MAX_ATTEMPTS times are marked failed instead.
+    """
+    now = _utcnow()
+    # 升级前遗留、没有租约的进行中任务同样视为失联
+    stale = (
+        DownloadJob.status.in_(_ACTIVE_STATUSES),
+        or_(DownloadJob.lease_expires_at.is_(None), DownloadJob.lease_expires_at < now),
+    )
+    released = {"lease_owner": None, "lease_expires_at": None, "updated_at": now}
+    retryable = DownloadJob.attempts < settings.job_max_attempts
+
+    total = 0
+    for statement in (
+        update(DownloadJob)
+        .where(*stale, DownloadJob.status == JobStatus.RUNNING, retryable)
+        .values(status=JobStatus.QUEUED, error_message=None, **released),
+        # 合并不经过认领计数，这里计入一次中断
+        update(DownloadJob)
+        .where(*stale, DownloadJob.status == JobStatus.MERGING, retryable)
+        .values(status=JobStatus.DOWNLOADED, error_message=None, attempts=DownloadJob.attempts + 1, **released),
+        update(DownloadJob)
+        .where(*stale)
+        .values(status=JobStatus.FAILED, error_message=LEASE_EXPIRED_MESSAGE, **released),
+    ):
+        result = db.execute(statement.execution_options(synchronize_session=False))
+        total += result.rowcount or 0
+    db.commit()
+    if total:
+        _wake_event.set()
+    _cleanup_abandoned_cancellations(db, now)
+    return total
+
+
+def _cleanup_abandoned_cancellations(db, now: datetime) -> None:
+    # 被中止的任务由持有租约的 worker 清理文件；它在察觉取消前退出时，租约过期后在这里补做
+    job_ids = [
+        job_id
+        for (job_id,) in db.query(DownloadJob.id).filter(
+            DownloadJob.status == JobStatus.FAILED,
+            DownloadJob.error_message.startswith(CANCELLED_MESSAGE),
+            DownloadJob.lease_expires_at.isnot(None),
+            DownloadJob.lease_expires_at < now,
+        )
+    ]
+    if not job_ids:
+        return
+    for job_id in job_ids:
+        cleanup_job_artifacts(job_id)
+    db.execute(
+        update(DownloadJob)
+        .where(DownloadJob.id.in_(job_ids))
+        .values(lease_owner=None, lease_expires_at=None)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+
+def _release_waiting_parents(db, parent_ids: list[int] | None = None) -> int:
+    """
+    Hand multi-album jobs whose album jobs have all finished, successfully or
+    not, on to the merge stage, which bundles the finished albums.
+    """
+    query = db.query(DownloadJob.id).filter(DownloadJob.status == JobStatus.WAITING)
+    if parent_ids is not None:
+        query = query.filter(DownloadJob.id.in_(parent_ids))
+    waiting = {job_id for (job_id,) in query.all()}
+    if not waiting:
+        return 0
+    busy = {
+        parent_id
+        for (parent_id,) in db.query(DownloadJob.parent_job_id)
+        .filter(DownloadJob.parent_job_id.in_(waiting), DownloadJob.status.in_(_UNFINISHED_STATUSES))
+        .distinct()
+        .all()
+    }
+    ready = waiting - busy
+    if not ready:
+        return 0
+    # 子任务结束后不会再回到未完成状态，条件更新只需防止多个进程重复推进
+    result = db.execute(
+        update(DownloadJob)
+        .where(DownloadJob.id.in_(ready), DownloadJob.status == JobStatus.WAITING)
+        .values(status=JobStatus.DOWNLOADED, updated_at=_utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    if result.rowcount:
+        _wake_event.set()
+    return result.rowcount or 0
+
+
+def _owner_is_dead_local_process(owner: str) -> bool:
+    # 租约标识为 主机名:PID:随机串；同一主机上 PID 已不存在（或被本进程复用，如容器重启）说明原进程已退出
+    hostname, _sep, rest = owner.partition(":")
+    pid_text, _sep, _token = rest.partition(":")
+    if hostname != socket.gethostname() or not pid_text.isdigit() or owner == WORKER_ID:
+        return False
+    pid = int(pid_text)
+    if pid == os.getpid():
+        return True
     try:
-        interrupted_jobs = (
-            db.query(DownloadJob)
-            .filter(DownloadJob.status.in_([JobStatus.RUNNING, JobStatus.MERGING]))
-            .all()
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        return False
+    return False
+
+
+def _release_dead_local_leases(db) -> None:
+    owners = [
+        owner
+        for (owner,) in db.query(DownloadJob.lease_owner)
+        .filter(DownloadJob.status.in_(_ACTIVE_STATUSES), DownloadJob.lease_owner.is_not(None))
+        .distinct()
+        .all()
+    ]
+    dead = [owner for owner in owners if _owner_is_dead_local_process(owner)]
+    if not dead:
+        return
+    # 重启后不必等租约自然过期，直接让本机已退出进程的任务立即续跑
+    db.execute(
+        update(DownloadJob)
+        .where(DownloadJob.status.in_(_ACTIVE_STATUSES), DownloadJob.lease_owner.in_(dead))
+        .values(lease_expires_at=None)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+
+def _heartbeat(db) -> None:
+    with _lock:
+        job_ids = list(_active_jobs)
+    if not job_ids:
+        return
+
+    now = _utcnow()
+    db.execute(
+        update(DownloadJob)
+        .where(
+            DownloadJob.id.in_(job_ids),
+            DownloadJob.lease_owner == WORKER_ID,
+            DownloadJob.status.in_(_ACTIVE_STATUSES),
+        )
+        .values(
+            heartbeat_at=now,
+            lease_expires_at=now + timedelta(seconds=settings.job_lease_seconds),
         )
-        for job in interrupted_jobs:
-            job.status = JobStatus.FAILED
-            if not job.error_message:
-                job.error_message = "任务在服务重启后中断，已标记为失败，请重新创建任务。"
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    _sync_cancellations(db, job_ids)
 
-        queued_jobs = db.query(DownloadJob).filter(DownloadJob.status == JobStatus.QUEUED).all()
-        queued_ids = [job.id for job in queued_jobs]
+
+def _sync_cancellations(db, job_ids: list[int] | None = None) -> None:
+    if job_ids is None:
+        with _lock:
+            job_ids = list(_active_jobs)
+    if not job_ids:
+        return
+
+    rows = {
+        row.id: row
+        for row in db.query(
+            DownloadJob.id,
+            DownloadJob.status,
+            DownloadJob.lease_owner,
+            DownloadJob.error_message,
+        ).filter(DownloadJob.id.in_(job_ids))
+    }
+    for job_id in job_ids:
+        row = rows.get(job_id)
+        # 任务被删除、被其他进程判定租约过期或被用户取消时，停止本地执行
+        if row is None or row.lease_owner != WORKER_ID or _is_cancelled(row.status, row.error_message):
+            request_cancel(job_id)
+
+
+def _flush_progress(db) -> None:
+    with _lock:
+        tracked = list(_job_progress.items())
+    written = False
+    for job_id, progress in tracked:
+        changes = progress.take_changes()
+        if changes is None:
+            continue
+        db.execute(
+            update(DownloadJob)
+            .where(
+                DownloadJob.id == job_id,
+                DownloadJob.lease_owner == WORKER_ID,
+                DownloadJob.status.in_(_ACTIVE_STATUSES),
+            )
+            .values(**changes, updated_at=_utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        written = True
+    if written:
         db.commit()
-    finally:
-        db.close()
 
-    for job_id in queued_ids:
-        enqueue_job(job_id)
 
+def _stage_limit(stage: _Stage) -> int:
+    if stage.name == "download" and _download_limit is not None:
+        return _download_limit.limit
+    return stage.slots
 
-def enqueue_job(job_id: int) -> None:
+
+def _free_slots(stage: _Stage) -> int:
     with _lock:
-        if job_id in _inflight_jobs:
-            return
-        _inflight_jobs.add(job_id)
+        busy = sum(1 for stage_name, _future in _active_jobs.values() if stage_name == stage.name)
+    return _stage_limit(stage) - busy
+
 
-    future = _executor.submit(_run_job, job_id)
+def current_download_limit() -> int:
+    return _stage_limit(_STAGES[0])
+
+
+def _adjust_download_limit() -> None:
     with _lock:
-        _futures[job_id] = future
-    future.add_done_callback(lambda _done, jid=job_id: _finalize_job_tracking(jid))
+        downloading = [job_id for job_id, (stage_name, _future) in _active_jobs.items() if stage_name == "download"]
+        active = {job_id: _job_progress[job_id] for job_id in downloading if job_id in _job_progress}
+    bytes_per_second, error_rate = _download_meter.sample(active)
+    previous = _download_limit.limit
+    # 只有槽位全部占满时才值得试探更高的并发
+    limit = _download_limit.update(
+        ThroughputSample(
+            bytes_per_second=bytes_per_second,
+            error_rate=error_rate,
+            cpu_load=cpu_load(),
+            saturated=len(downloading) >= previous,
+        )
+    )
+    if limit > previous:
+        _wake_event.set()
 
 
-def _run_job(job_id: int) -> None:
+def _submit_claimed_job(job_id: int, stage: _Stage) -> None:
+    token = CancellationToken()
+    with _lock:
+        future = _executors[stage.name].submit(_execute_stage, job_id, stage, token)
+        _active_jobs[job_id] = (stage.name, future)
+        _cancel_tokens[job_id] = token
+    future.add_done_callback(lambda done, jid=job_id: _finalize_job_tracking(jid, done))
+
+
+def _poll_loop() -> None:
+    while not _stop_event.is_set():
+        _wake_event.clear()
+        db = SessionLocal()
+        try:
+            for stage in _STAGES:
+                while _free_slots(stage) > 0:
+                    job_id = _claim_next_job(db, stage)
+                    if job_id is None:
+                        break
+                    _submit_claimed_job(job_id, stage)
+        except Exception:  # noqa: BLE001
+            db.rollback()
+        finally:
+            db.close()
+        _wake_event.wait(settings.job_poll_interval_seconds)
+
+
+def _heartbeat_loop() -> None:
+    while not _stop_event.wait(settings.job_heartbeat_seconds):
+        db = SessionLocal()
+        try:
+            _heartbeat(db)
+            _expire_stale_leases(db)
+            _release_waiting_parents(db)
+        except Exception:  # noqa: BLE001
+            db.rollback()
+        finally:
+            db.close()
+
+
+def _progress_loop() -> None:
+    # 本进程所有任务的进度在同一事务中批量写入；顺带检查取消，
+    # 其他进程（API）中止的任务无需等到下次心跳才停止
+    while not _stop_event.wait(settings.job_progress_flush_seconds):
+        db = SessionLocal()
+        try:
+            _flush_progress(db)
+            _sync_cancellations(db)
+        except Exception:  # noqa: BLE001
+            db.rollback()
+        finally:
+            db.close()
+
+
+def _concurrency_loop() -> None:
+    # 限额降低时不打断正在下载的任务，只是在它们结束前不再认领新任务
+    while not _stop_event.wait(settings.adaptive_interval_seconds):
+        try:
+            _adjust_download_limit()
+        except Exception:  # noqa: BLE001
+            pass
+
+
+def recover_unfinished_jobs() -> None:
+    """
+    Recover persisted jobs after backend restart:
+    - running/merging jobs of worker processes on this host that are gone,
+      or whose lease has expired, are re-queued to resume
+    - queued/downloaded jobs stay in the table and are claimed by the next poll
+    - multi-album jobs whose album jobs all finished meanwhile move on to merge
+    """
     db = SessionLocal()
-    job_temp_dir = settings.temp_root / f"job_{job_id}"
-    source_dir = job_temp_dir / "source"
-    option_file = job_temp_dir / "option.yml"
-    artifact_dir = settings.download_root / f"job_{job_id}"
-    pdf_temp_dir = job_temp_dir / "pdf_tmp"
     try:
-        with _lock:
-            _thread_ids[job_id] = get_ident()
+        _release_dead_local_leases(db)
+        _expire_stale_leases(db)
+        _release_waiting_parents(db)
+    finally:
+        db.close()
 
-        job = db.query(DownloadJob).filter(DownloadJob.id == job_id).first()
-        if job is None:
-            return
-        if job.status == JobStatus.FAILED and (job.error_message or "").startswith(CANCELLED_MESSAGE):
-            return
 
-        user = db.query(User).filter(User.id == job.user_id).first()
-        if user is None:
-            job.status = JobStatus.FAILED
-            job.error_message = "Owner user does not exist"
-            db.commit()
-            return
+def start_job_worker() -> None:
+    global _download_limit
+    if _worker_threads:
+        return
+    loops = [
+        (_poll_loop, "job-queue-poller"),
+        (_heartbeat_loop, "job-queue-heartbeat"),
+        (_progress_loop, "job-progress"),
+    ]
+    _download_limit = None
+    if settings.adaptive_concurrency_enabled:
+        # 从 MAX_PARALLEL_JOBS 起步，在管理员配置的上下限之间调节
+        _download_limit = AdaptiveConcurrency(
+            settings.adaptive_min_parallel_jobs,
+            settings.adaptive_max_parallel_jobs,
+            settings.max_parallel_jobs,
+        )
+        loops.append((_concurrency_loop, "job-concurrency"))
+    # 线程池在启动时按当前配置创建，独立 worker 进程可在启动前覆盖并发数；自适应时按上限创建
+    for stage in _STAGES:
+        max_workers = _download_limit.maximum if stage.name == "download" and _download_limit else stage.slots
+        _executors[stage.name] = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"job-{stage.name}")
+    _stop_event.clear()
+    for target, name in loops:
+        thread = Thread(target=target, name=name, daemon=True)
+        thread.start()
+        _worker_threads.append(thread)
+
+
+def stop_job_worker(wait: bool = False) -> None:
+    """
+    Stop claiming new jobs. With wait=True, block until the jobs already
+    running in this process finish their current stage; their leases keep
+    being renewed meanwhile.
+    """
+    pollers = [thread for thread in _worker_threads if thread.name == "job-queue-poller"]
+    _stop_event.set()
+    _wake_event.set()
+    for thread in pollers:
+        thread.join(timeout=5)
+
+    if wait:
+        # 排空期间心跳线程已随停止事件退出，这里接管续约
+        while True:
+            with _lock:
+                pending = [future for _stage_name, future in _active_jobs.values()]
+            if not pending:
+                break
+            db = SessionLocal()
+            try:
+                _heartbeat(db)
+            except Exception:  # noqa: BLE001
+                db.rollback()
+            finally:
+                db.close()
+            wait_futures(pending, timeout=settings.job_heartbeat_seconds)
+
+    for thread in _worker_threads:
+        thread.join(timeout=5)
+    _worker_threads.clear()
+    for executor in _executors.values():
+        executor.shutdown(wait=False)
+    _executors.clear()
 
-        job.status = JobStatus.RUNNING
-        job.error_message = None
-        job.source_dir = str(source_dir)
-        db.commit()
-        _ensure_not_cancelled(job_id, db)
 
-        payload = json.loads(job.payload_json)
+def enqueue_job(job_id: int) -> None:
+    # 任务已以 QUEUED 状态落库，这里只负责唤醒本进程的轮询线程；其他进程会在下次轮询时看到它
+    _wake_event.set()
 
-        credential = None
-        if user.jm_username and user.jm_password_encrypted:
-            credential = JmCredential(
-                username=user.jm_username,
-                password=decrypt_text(user.jm_password_encrypted),
-            )
 
-        ensure_dir(job_temp_dir)
-        ensure_dir(source_dir)
-        ensure_dir(artifact_dir)
-        ensure_dir(pdf_temp_dir)
-        _ensure_not_cancelled(job_id, db)
+def _owned_job(db, job_id: int) -> DownloadJob | None:
+    # 租约已被回收的任务由接手方负责状态，本进程不再覆盖
+    db.expire_all()
+    job = db.query(DownloadJob).filter(DownloadJob.id == job_id).first()
+    if job is None or job.lease_owner != WORKER_ID:
+        return None
+    return job
+
+
+def _run_download_stage(
+    db,
+    job: DownloadJob,
+    paths: _JobPaths,
+    token: CancellationToken,
+    progress: JobProgress,
+) -> None:
+    user = db.query(User).filter(User.id == job.user_id).first()
+    if user is None:
+        raise ValueError("Owner user does not exist")
+
+    payload = json.loads(job.payload_json)
+    if job.job_type == JobType.MULTI_ALBUM and settings.multi_album_split_enabled:
+        _split_into_album_jobs(db, job, payload)
+        return
+
+    job.source_dir = str(paths.source_dir)
+    db.commit()
+    _checkpoint(db, job.id, token)
+
+    credential = None
+    if user.jm_username and user.jm_password_encrypted:
+        credential = JmCredential(
+            username=user.jm_username,
+            password=decrypt_text(user.jm_password_encrypted),
+        )
 
+    ensure_dir(paths.temp_dir)
+    ensure_dir(paths.source_dir)
+    ensure_dir(paths.artifact_dir)
+    ensure_dir(paths.pdf_temp_dir)
+    if job.attempts > 1:
+        # 中断后续跑：复用已下载的页面，只删掉写了一半或无法解析的文件让 jmcomic 重新下载
+        discard_broken_pages(paths.source_dir)
+        discard_broken_pages(paths.pdf_temp_dir / "pages")
+    token.raise_if_cancelled()
+
+    profile = ENCODING_PROFILES[job.output_profile]
+    pipeline: PageConversionPipeline | None = None
+    if settings.merge_pipeline_enabled and job.artifact_format == ArtifactFormat.PDF:
+        # 转换结果写入合并阶段使用的页面缓存目录，合并时直接复用
+        pipeline = PageConversionPipeline(paths.source_dir, paths.pdf_temp_dir / "pages", profile, token)
+    try:
         run_download_job(
             job_type=job.job_type,
             payload=payload,
-            source_dir=source_dir,
-            option_file=option_file,
+            source_dir=paths.source_dir,
+            option_file=paths.option_file,
             credential=credential,
+            on_image_saved=pipeline.submit if pipeline is not None else None,
+            profile=profile,
+            cancel_token=token,
+            progress=progress,
+            image_threads=job.image_threads,
+            photo_threads=job.photo_threads,
         )
-        _ensure_not_cancelled(job_id, db)
+    finally:
+        # 不在下载槽位里等待转换：尚未开始的页面撤回，交给合并阶段按缓存续做
+        if pipeline is not None:
+            pipeline.close()
+    _checkpoint(db, job.id, token)
+
+    # 释放下载槽位，等待合并阶段认领
+    _store_progress(job, progress)
+    job.status = JobStatus.DOWNLOADED
+    job.lease_expires_at = None
+    db.commit()
+
+
+def _store_progress(job: DownloadJob, progress: JobProgress) -> None:
+    for name, value in progress.values().items():
+        setattr(job, name, value)
+
+
+def _split_into_album_jobs(db, job: DownloadJob, payload: dict) -> None:
+    # 每个本子一个 ALBUM 子任务，与普通任务一样排队，由任意 worker 并行下载和合并
+    existing = {json.loads(child.payload_json).get("id_value") for child in _child_jobs(db, job.id)}
+    for album_id in payload.get("album_ids") or []:
+        if album_id in existing:
+            continue
+        db.add(
+            DownloadJob(
+                user_id=job.user_id,
+                parent_job_id=job.id,
+                job_type=JobType.ALBUM,
+                artifact_format=job.artifact_format,
+                output_profile=job.output_profile,
+                image_threads=job.image_threads,
+                photo_threads=job.photo_threads,
+                payload_json=json.dumps({"id_value": album_id}, ensure_ascii=False),
+                status=JobStatus.QUEUED,
+            )
+        )
+    # 子任务与父任务状态在同一事务中提交，父任务等待期间不占用槽位也不需要续约
+    job.status = JobStatus.WAITING
+    job.lease_expires_at = None
+    db.commit()
+    _wake_event.set()
+
+
+def _child_jobs(db, job_id: int) -> list[DownloadJob]:
+    return db.query(DownloadJob).filter(DownloadJob.parent_job_id == job_id).order_by(DownloadJob.id).all()
+
+
+def _bundle_album_jobs(
+    db,
+    job: DownloadJob,
+    children: list[DownloadJob],
+    paths: _JobPaths,
+    token: CancellationToken,
+) -> None:
+    finished: list[Path] = []
+    failed: list[str] = []
+    for child in children:
+        artifact = Path(child.result_file_path) if child.result_file_path else None
+        if child.status == JobStatus.DONE and artifact is not None and artifact.is_file():
+            finished.append(artifact)
+        else:
+            failed.append(json.loads(child.payload_json).get("id_value") or f"job_{child.id}")
+    if not finished:
+        raise ValueError(f"所有本子均下载失败：{', '.join(failed)}")
+
+    payload = json.loads(job.payload_json)
+    base_name = artifact_base_name(job.job_type, payload, fallback_name=f"job_{job.id}")
+    zip_path = bundle_album_artifacts(finished, paths.artifact_dir / f"{sanitize_filename(base_name)}.zip", token)
+    _checkpoint(db, job.id, token)
+
+    now = datetime.now(timezone.utc)
+    expire_at = now + timedelta(minutes=settings.link_expire_minutes)
+
+    job.result_file_path = str(zip_path)
+    job.result_file_name = zip_path.name
+    job.download_token = secrets.token_urlsafe(24)
+    job.merged_at = now
+    job.expires_at = expire_at
+    job.error_message = f"{ALBUMS_FAILED_MESSAGE}{', '.join(failed)}" if failed else None
+    job.status = JobStatus.DONE
+    job.lease_expires_at = None
+    # 本子产物已打包进压缩包，子任务只保留状态记录，随父任务一起过期
+    for child in children:
+        child.result_file_path = None
+        child.source_dir = None
+        child.download_token = None
+        child.expires_at = expire_at
+    db.commit()
+    for child in children:
+        cleanup_job_artifacts(child.id)
+
+
+def _run_merge_stage(
+    db,
+    job: DownloadJob,
+    paths: _JobPaths,
+    token: CancellationToken,
+    progress: JobProgress,
+) -> None:
+    if job.job_type == JobType.MULTI_ALBUM:
+        children = _child_jobs(db, job.id)
+        if children:
+            _bundle_album_jobs(db, job, children, paths, token)
+            return
 
-        job.status = JobStatus.MERGING
-        db.commit()
-        _ensure_not_cancelled(job_id, db)
+    payload = json.loads(job.payload_json)
+    profile = ENCODING_PROFILES[job.output_profile]
+    base_name = artifact_base_name(job.job_type, payload, fallback_name=f"job_{job.id}")
+    stats = PageStats()
+    artifact_path, artifact_name = build_artifact_from_download(
+        source_dir=paths.source_dir,
+        artifact_dir=paths.artifact_dir,
+        temp_dir=paths.pdf_temp_dir,
+        job_type=job.job_type,
+        base_name=base_name,
+        stats=stats,
+        artifact_format=job.artifact_format,
+        profile=profile,
+        cancel_token=token,
+        progress=progress,
+    )
+    _checkpoint(db, job.id, token)
 
-        base_name = artifact_base_name(job.job_type, payload, fallback_name=f"job_{job.id}")
-        artifact_path, artifact_name = build_artifact_from_download(
-            source_dir=source_dir,
-            artifact_dir=artifact_dir,
-            temp_dir=pdf_temp_dir,
-            job_type=job.job_type,
-            base_name=base_name,
-        )
-        _ensure_not_cancelled(job_id, db)
-
-        now = datetime.now(timezone.utc)
-        expire_at = now + timedelta(minutes=settings.link_expire_minutes)
-
-        job.result_file_path = str(artifact_path)
-        job.result_file_name = artifact_name
-        job.source_dir = str(source_dir)
-        job.download_token = secrets.token_urlsafe(24)
-        job.merged_at = now
-        job.expires_at = expire_at
-        job.status = JobStatus.DONE
-        db.commit()
+    now = datetime.now(timezone.utc)
+    expire_at = now + timedelta(minutes=settings.link_expire_minutes)
+
+    job.result_file_path = str(artifact_path)
+    job.result_file_name = artifact_name
+    job.source_dir = str(paths.source_dir)
+    job.download_token = secrets.token_urlsafe(24)
+    job.merged_at = now
+    job.expires_at = expire_at
+    job.pages_passthrough = stats.passthrough
+    job.pages_reencoded = stats.reencoded
+    _store_progress(job, progress)
+    job.status = JobStatus.DONE
+    job.lease_expires_at = None
+    db.commit()
+
+
+_STAGES = (
+    # 下载受网络限制，可以开得多；合并是 CPU 密集型，页面转换在共享的进程池中执行
+    _Stage("download", JobStatus.QUEUED, JobStatus.RUNNING, _run_download_stage, "max_parallel_jobs"),
+    _Stage("merge", JobStatus.DOWNLOADED, JobStatus.MERGING, _run_merge_stage, "max_parallel_merges"),
+)
+
+
+def _execute_stage(job_id: int, stage: _Stage, token: CancellationToken) -> None:
+    db = SessionLocal()
+    parent_id: int | None = None
+    progress: JobProgress | None = None
+    try:
+        job = db.query(DownloadJob).filter(DownloadJob.id == job_id).first()
+        # 认领后到开始执行之间任务可能已被取消、删除或判定失联
+        if job is None or job.lease_owner != WORKER_ID or job.status != stage.active:
+            return
+        parent_id = job.parent_job_id
+        if stage.waiting == JobStatus.QUEUED:
+            # 下载阶段重新计数，续跑时已存在的页面会再次计入
+            progress = JobProgress()
+        else:
+            progress = JobProgress(
+                images_total=job.images_total,
+                images_done=job.images_done,
+                bytes_downloaded=job.bytes_downloaded,
+            )
+        with _lock:
+            _job_progress[job_id] = progress
+
+        stage.run(db, job, _JobPaths.for_job(job_id), token, progress)
 
     except JobCancelledError:
-        failed_job = db.query(DownloadJob).filter(DownloadJob.id == job_id).first()
-        if failed_job is not None:
-            failed_job.status = JobStatus.FAILED
-            failed_job.error_message = CANCELLED_MESSAGE
-            failed_job.result_file_path = None
-            failed_job.result_file_name = None
-            failed_job.download_token = None
-            failed_job.merged_at = None
-            failed_job.expires_at = None
-            failed_job.source_dir = None
-            db.commit()
-        cleanup_job_artifacts(job_id)
+        db.rollback()
+        db.expire_all()
+        current = db.query(DownloadJob).filter(DownloadJob.id == job_id).first()
+        # 租约已被回收时任务会在别处续跑，不能清理它正在使用的目录
+        if current is None or current.lease_owner == WORKER_ID:
+            if current is not None:
+                current.status = JobStatus.FAILED
+                current.error_message = CANCELLED_MESSAGE
+                current.result_file_path = None
+                current.result_file_name = None
+                current.download_token = None
+                current.merged_at = None
+                current.expires_at = None
+                current.source_dir = None
+                # 清除租约表示文件已由本进程清理，无需过期清扫再处理
+                current.lease_expires_at = None
+                db.commit()
+            cleanup_job_artifacts(job_id)
     except Exception as exc:  # noqa: BLE001
-        failed_job = db.query(DownloadJob).filter(DownloadJob.id == job_id).first()
+        db.rollback()
+        failed_job = _owned_job(db, job_id)
         if failed_job is not None:
-            failed_job.status = JobStatus.FAILED
+            retry = (
+                failed_job.parent_job_id is not None
+                and stage.waiting == JobStatus.QUEUED
+                and failed_job.attempts < settings.job_max_attempts
+            )
+            # 单个本子下载失败只重试该本子，保留已下载的页面续跑
+            failed_job.status = JobStatus.QUEUED if retry else JobStatus.FAILED
             failed_job.error_message = str(exc)
+            failed_job.lease_expires_at = None
             db.commit()
     finally:
+        with _lock:
+            if _job_progress.get(job_id) is progress:
+                _job_progress.pop(job_id, None)
+        if _download_limit is not None and progress is not None and stage.name == "download":
+            _download_meter.retire(job_id, progress)
+        if parent_id is not None:
+            try:
+                _release_waiting_parents(db, [parent_id])
+            except Exception:  # noqa: BLE001
+                # 心跳线程会定期补做
+                db.rollback()
         db.close()
@@ -4,15 +4,20 @@ from apscheduler.schedulers.background import BackgroundScheduler
 
 from backend.app.core.config import settings
 from backend.app.db.session import SessionLocal
+from backend.app.services.jm_service import probe_open_circuits
 from backend.app.services.job_service import expire_and_cleanup_jobs
+from backend.app.services.response_cache import purge_expired_responses
 
 _scheduler: BackgroundScheduler | None = None
+_probe_scheduler: BackgroundScheduler | None = None
 
 
 def _cleanup_tick() -> None:
     db = SessionLocal()
     try:
         expire_and_cleanup_jobs(db)
+        if settings.response_cache_backend == "database":
+            purge_expired_responses(db)
     finally:
         db.close()
 
@@ -25,3 +30,40 @@ def start_cleanup_scheduler() -> None:
     _scheduler = BackgroundScheduler(timezone=settings.app_timezone)
     _scheduler.add_job(_cleanup_tick, trigger="interval", minutes=1, id="cleanup-expired-jobs", replace_existing=True)
     _scheduler.start()
+
+
+def stop_cleanup_scheduler() -> None:
+    global _scheduler
+    if _scheduler is None:
+        return
+    _scheduler.shutdown(wait=False)
+    _scheduler = None
+
+
+def start_health_probe() -> None:
+    # 健康度按进程记录，每个发起 JM 请求的进程（API 与 worker）都要各自探测，
+    # 与只需一处运行的清理任务分开调度
+    global _probe_scheduler
+    if _probe_scheduler is not None:
+        return
+    if not settings.jm_health_enabled or settings.jm_health_probe_interval_seconds <= 0:
+        return
+
+    _probe_scheduler = BackgroundScheduler(timezone=settings.app_timezone)
+    _probe_scheduler.add_job(
+        probe_open_circuits,
+        trigger="interval",
+        seconds=settings.jm_health_probe_interval_seconds,
+        id="probe-jm-domains",
+        replace_existing=True,
+        max_instances=1,
+    )
+    _probe_scheduler.start()
+
+
+def stop_health_probe() -> None:
+    global _probe_scheduler
+    if _probe_scheduler is None:
+        return
+    _probe_scheduler.shutdown(wait=False)
+    _probe_scheduler = None
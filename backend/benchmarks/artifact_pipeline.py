@@ -0,0 +1,266 @@
+"""
+Offline benchmark for the MERGING stage.
+
+Generates synthetic download trees in the `Bd_Aid_Pindex` layout
+(`<album>/<photo index>/<page>.<ext>`) with a deterministic mix of
+JPEG/PNG/WebP pages, then times merge_tree_to_pdf (package_tree_to_cbz
+with --format cbz) and build_artifact_from_download against them. Each case runs in a fresh
+process so that peak RSS is per case.
+
+    python -m backend.benchmarks.artifact_pipeline --albums 3 --pages 40
+    python -m backend.benchmarks.artifact_pipeline --json > before.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from PIL import Image
+
+# 页面类型及权重：(格式, 后缀, 是否灰度)
+_PAGE_KINDS = [
+    ("JPEG", ".jpg", False),
+    ("JPEG", ".jpg", True),
+    ("PNG", ".png", False),
+    ("PNG", ".png", True),
+    ("WEBP", ".webp", False),
+    ("WEBP", ".webp", True),
+]
+_PAGE_WEIGHTS = [25, 20, 10, 10, 20, 15]
+_PAGE_WIDTHS = [720, 1080, 1200, 1600, 2400]
+_CASES = ("merge", "album", "multi")
+
+
+def _synthetic_page(rng: random.Random, width: int, height: int, grayscale: bool) -> Image.Image:
+    # 低分辨率噪声放大后叠加渐变，压缩率接近扫描页，远比纯色图真实
+    def channel() -> Image.Image:
+        gradient = Image.linear_gradient("L").rotate(rng.choice([0, 90, 180, 270])).resize((width, height))
+        scale = rng.choice([4, 8, 16])
+        noise = Image.effect_noise((width // scale, height // scale), rng.uniform(40, 90))
+        noise = noise.resize((width, height), Image.Resampling.BICUBIC)
+        return Image.blend(gradient, noise, rng.uniform(0.3, 0.6))
+
+    if grayscale:
+        return channel()
+    return Image.merge("RGB", (channel(), channel(), channel()))
+
+
+def generate_tree(
+    root: Path,
+    albums: int,
+    photos: int,
+    pages_min: int,
+    pages_max: int,
+    seed: int,
+) -> int:
+    rng = random.Random(seed)
+    total = 0
+    for album_index in range(albums):
+        album_id = str(100000 + album_index * 7919)
+        for photo_index in range(1, photos + 1):
+            photo_dir = root / album_id / str(photo_index)
+            photo_dir.mkdir(parents=True, exist_ok=True)
+            for page_index in range(1, rng.randint(pages_min, pages_max) + 1):
+                image_format, suffix, grayscale = rng.choices(_PAGE_KINDS, weights=_PAGE_WEIGHTS)[0]
+                width = rng.choice(_PAGE_WIDTHS)
+                height = int(width * rng.uniform(1.3, 1.6))
+                image = _synthetic_page(rng, width, height, grayscale)
+                if image_format == "PNG":
+                    options = {"compress_level": 1}
+                else:
+                    options = {"quality": rng.choice([80, 90, 95])}
+                image.save(photo_dir / f"{page_index:05d}{suffix}", format=image_format, **options)
+                total += 1
+    return total
+
+
+def _peak_rss_mb(who: int) -> float:
+    peak = resource.getrusage(who).ru_maxrss
+    # Linux 单位为 KiB，macOS 为字节
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _run_case(case: str, source_root: str, work_dir: str, artifact_format: str, profile_name: str, pipeline: bool) -> dict:
+    from backend.app.models.job import ArtifactFormat, JobType, OutputProfile
+    from backend.app.services.image_pdf_service import (
+        ENCODING_PROFILES,
+        PageConversionPipeline,
+        PageStats,
+        build_artifact_from_download,
+        list_images_sorted,
+        merge_tree_to_pdf,
+        package_tree_to_cbz,
+        shutdown_convert_pool,
+    )
+
+    source = Path(source_root)
+    work = Path(work_dir)
+    profile = ENCODING_PROFILES[OutputProfile(profile_name)]
+    fmt = ArtifactFormat(artifact_format)
+    if case == "merge":
+        # 单本子：取第一个本子目录
+        source = min(path for path in source.iterdir() if path.is_dir())
+
+    pages = list_images_sorted(source)
+    stats = PageStats()
+    feeder = None
+    started = time.perf_counter()
+    try:
+        if pipeline and fmt == ArtifactFormat.PDF:
+            # 模拟下载瞬间完成：所有页面先交给流水线，再进入合并
+            feeder = PageConversionPipeline(source, work / "pages", profile)
+            for page in pages:
+                feeder.submit(page)
+
+        if case == "merge" and fmt == ArtifactFormat.CBZ:
+            artifact = package_tree_to_cbz(source, work / "out.cbz", images=pages)
+        elif case == "merge":
+            artifact = merge_tree_to_pdf(
+                source, work / "out.pdf", work / "tmp", stats=stats, pipeline=feeder, profile=profile
+            )
+        else:
+            artifact, _name = build_artifact_from_download(
+                source_dir=source,
+                artifact_dir=work / "out",
+                temp_dir=work / "tmp",
+                job_type=JobType.ALBUM if case == "album" else JobType.MULTI_ALBUM,
+                base_name="bench",
+                stats=stats,
+                pipeline=feeder,
+                artifact_format=fmt,
+                profile=profile,
+            )
+        elapsed = time.perf_counter() - started
+    finally:
+        if feeder is not None:
+            feeder.close()
+        # 等待进程池退出，子进程的峰值内存才会计入 RUSAGE_CHILDREN
+        shutdown_convert_pool(wait=True)
+
+    return {
+        "case": case,
+        "pages": len(pages),
+        "seconds": round(elapsed, 3),
+        "pages_per_sec": round(len(pages) / elapsed, 2) if elapsed else None,
+        "output_bytes": artifact.stat().st_size,
+        "passthrough": stats.passthrough,
+        "reencoded": stats.reencoded,
+        "peak_rss_mb": round(_peak_rss_mb(resource.RUSAGE_SELF), 1),
+        "peak_rss_children_mb": round(_peak_rss_mb(resource.RUSAGE_CHILDREN), 1),
+    }
+
+
+def _git_revision() -> str | None:
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip() or None
+
+
+def _parse_args(argv: list[str] | None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the image-to-artifact pipeline on synthetic albums")
+    parser.add_argument("--albums", type=int, default=3)
+    parser.add_argument("--photos", type=int, default=2, help="chapters per album")
+    parser.add_argument("--pages", type=int, default=30, help="max pages per chapter")
+    parser.add_argument("--min-pages", type=int, default=None, help="min pages per chapter (default: pages // 2)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--cases", default=",".join(_CASES), help=f"comma separated subset of {','.join(_CASES)}")
+    parser.add_argument("--format", dest="artifact_format", choices=["pdf", "cbz"], default="pdf")
+    parser.add_argument("--profile", choices=["archive", "balanced", "mobile"], default="archive")
+    parser.add_argument("--pipeline", action="store_true", help="feed pages through PageConversionPipeline first")
+    parser.add_argument("--workers", type=int, default=None, help="override PDF_CONVERT_WORKERS")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--tree", type=Path, default=None, help="reuse/keep the generated tree in this directory")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = _parse_args(argv)
+    cases = [case.strip() for case in args.cases.split(",") if case.strip()]
+    unknown = set(cases) - set(_CASES)
+    if unknown:
+        raise SystemExit(f"Unknown cases: {', '.join(sorted(unknown))}")
+    if args.workers is not None:
+        # 子进程重新加载配置，通过环境变量传递
+        os.environ["PDF_CONVERT_WORKERS"] = str(args.workers)
+
+    context = multiprocessing.get_context("spawn")
+    work_root = Path(tempfile.mkdtemp(prefix="jm-bench-"))
+    tree_root = args.tree or work_root / "source"
+    try:
+        if args.tree is not None and tree_root.exists() and any(tree_root.iterdir()):
+            total_pages = sum(1 for path in tree_root.rglob("*") if path.is_file())
+        else:
+            started = time.perf_counter()
+            # 生成过程也放到子进程里，避免抬高后续用例继承的峰值内存
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                total_pages = executor.submit(
+                    generate_tree,
+                    tree_root,
+                    args.albums,
+                    args.photos,
+                    args.min_pages if args.min_pages is not None else max(1, args.pages // 2),
+                    args.pages,
+                    args.seed,
+                ).result()
+            if not args.json:
+                print(f"generated {total_pages} pages in {time.perf_counter() - started:.1f}s under {tree_root}")
+
+        results = []
+        for case in cases:
+            for run in range(args.repeat):
+                run_dir = work_root / f"{case}-{run}"
+                run_dir.mkdir()
+                # 每个用例独立进程，峰值内存互不影响
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                    result = executor.submit(
+                        _run_case,
+                        case,
+                        str(tree_root),
+                        str(run_dir),
+                        args.artifact_format,
+                        args.profile,
+                        args.pipeline,
+                    ).result()
+                shutil.rmtree(run_dir, ignore_errors=True)
+                result["run"] = run
+                results.append(result)
+                if not args.json:
+                    print(
+                        f"{case:<6} run {run}: {result['pages']} pages in {result['seconds']:.2f}s "
+                        f"({result['pages_per_sec']} pages/s), output {result['output_bytes'] / 1024 / 1024:.1f} MiB, "
+                        f"passthrough {result['passthrough']} / reencoded {result['reencoded']}, "
+                        f"peak RSS {result['peak_rss_mb']} MiB (pool {result['peak_rss_children_mb']} MiB)"
+                    )
+
+        if args.json:
+            report = {
+                "revision": _git_revision(),
+                "params": {
+                    key: (str(value) if isinstance(value, Path) else value) for key, value in vars(args).items()
+                },
+                "total_pages": total_pages,
+                "results": results,
+            }
+            print(json.dumps(report, indent=2))
+    finally:
+        shutil.rmtree(work_root, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+"""
+Shared fixtures. The whole session runs against a throwaway SQLite database
+and storage root; the environment is set before any backend module reads
+the settings.
+"""
+
+from __future__ import annotations
+
+import os
+import shutil
+import tempfile
+
+_ROOT = tempfile.mkdtemp(prefix="jm-web-tests-")
+os.environ.update(
+    DATABASE_URL=f"sqlite:///{_ROOT}/app.db",
+    DOWNLOAD_ROOT=f"{_ROOT}/downloads",
+    TEMP_ROOT=f"{_ROOT}/tmp",
+    EMBEDDED_WORKER_ENABLED="false",
+    # 页面转换在测试进程内完成，不启动进程池
+    PDF_CONVERT_WORKERS="1",
+)
+
+import pytest  # noqa: E402
+
+from backend.app import models  # noqa: E402,F401  注册全部模型
+from backend.app.db.base import Base  # noqa: E402
+from backend.app.db.schema import ensure_schema  # noqa: E402
+from backend.app.db.session import SessionLocal, engine  # noqa: E402
+from backend.app.models.user import User, UserRole  # noqa: E402
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _database():
+    ensure_schema(engine)
+    yield
+    engine.dispose()
+    shutil.rmtree(_ROOT, ignore_errors=True)
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        with engine.begin() as conn:
+            for table in reversed(Base.metadata.sorted_tables):
+                conn.execute(table.delete())
+
+
+@pytest.fixture
+def make_user(db):
+    def _make(username: str, role: UserRole = UserRole.USER) -> User:
+        # 这些测试不走登录流程，不需要真实的密码哈希
+        user = User(username=username, password_hash="!", role=role)
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+        return user
+
+    return _make
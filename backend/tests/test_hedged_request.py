@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+from threading import Event
+import time
+
+import pytest
+
+from backend.app.core.config import settings
+from backend.app.services import jm_health, jm_service
+from backend.app.services.jm_service import HEDGE_LOST_MESSAGE, _hedged_request
+from backend.app.utils.cancellation import JobCancelledError
+
+
+class _FakeClient:
+    client_key = "fake"
+
+    def update_request_with_specify_domain(self, kwargs, domain, is_image=False):
+        pass
+
+
+_TrackedFakeClient = jm_health._tracked_client_class(_FakeClient)
+
+
+@pytest.fixture(autouse=True)
+def hedge_pool(monkeypatch):
+    monkeypatch.setattr(settings, "jm_hedge_delay_ms", 50)
+    monkeypatch.setattr(settings, "jm_upstream_concurrency", 4)
+    monkeypatch.setattr(jm_service, "_hedge_executor", None)
+    monkeypatch.setattr(jm_service, "_hedge_slots", None)
+    yield
+    if jm_service._hedge_executor is not None:
+        jm_service._hedge_executor.shutdown(wait=True)
+
+
+def test_hedge_wins_and_the_slow_request_stops_before_its_next_attempt():
+    slow_started, release = Event(), Event()
+    outcome: dict[str, object] = {}
+    finished = Event()
+
+    def request(impl: str) -> str:
+        if impl == "html":
+            return "from html"
+        slow_started.set()
+        release.wait(5)
+        try:
+            # jmcomic 在每次尝试前都会调用它，被中止的请求在这里停下
+            _TrackedFakeClient().update_request_with_specify_domain({}, "example.org")
+        except JobCancelledError as exc:
+            outcome["error"] = str(exc)
+            raise
+        finally:
+            finished.set()
+        outcome["error"] = None
+        return "from api"
+
+    started = time.monotonic()
+    assert _hedged_request(["api", "html"], request) == "from html"
+    elapsed = time.monotonic() - started
+
+    assert slow_started.is_set()
+    assert elapsed >= settings.jm_hedge_delay_ms / 1000
+    release.set()
+    assert finished.wait(5)
+    assert outcome["error"] == HEDGE_LOST_MESSAGE
+
+
+def test_failure_starts_the_next_impl_without_waiting_for_the_delay(monkeypatch):
+    monkeypatch.setattr(settings, "jm_hedge_delay_ms", 5000)
+
+    def request(impl: str) -> str:
+        if impl == "api":
+            raise RuntimeError("api broken")
+        return "from html"
+
+    started = time.monotonic()
+    assert _hedged_request(["api", "html"], request) == "from html"
+    assert time.monotonic() - started < 2
+
+
+def test_all_failures_are_reported_in_impl_order():
+    def request(impl: str) -> str:
+        raise RuntimeError(f"{impl} broken")
+
+    with pytest.raises(RuntimeError, match="api: api broken; html: html broken"):
+        _hedged_request(["api", "html"], request)
+
+
+def test_no_hedge_is_sent_when_the_upstream_budget_is_used_up(monkeypatch):
+    monkeypatch.setattr(settings, "jm_upstream_concurrency", 1)
+    called: list[str] = []
+
+    def request(impl: str) -> str:
+        called.append(impl)
+        time.sleep(0.3)
+        return f"from {impl}"
+
+    assert _hedged_request(["api", "html"], request) == "from api"
+    assert called == ["api"]
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+from types import SimpleNamespace
+
+import pytest
+
+from backend.app.core.config import settings
+from backend.app.services import jm_health
+from backend.app.services.jm_health import HealthTracker
+
+_DOMAINS = ["primary", "backup", "spare"]
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(jm_health, "time", SimpleNamespace(monotonic=clock.monotonic))
+    monkeypatch.setattr(settings, "jm_health_enabled", True)
+    monkeypatch.setattr(settings, "jm_circuit_failure_threshold", 3)
+    monkeypatch.setattr(settings, "jm_circuit_open_seconds", 60)
+    monkeypatch.setattr(settings, "jm_timeout_seconds", 15)
+    return clock
+
+
+def _fail(tracker: HealthTracker, domain: str, times: int = 1) -> None:
+    for _ in range(times):
+        tracker.record("api", domain, False, 0.1)
+
+
+def _circuit(tracker: HealthTracker, domain: str):
+    return next(item for item in tracker.snapshot() if item.domain == domain)
+
+
+def test_unmeasured_domains_keep_their_configured_position(clock):
+    tracker = HealthTracker()
+    tracker.record("api", "spare", True, 0.05)
+
+    assert tracker.order_domains("api", _DOMAINS) == _DOMAINS
+
+    tracker.record("api", "primary", True, 0.5)
+    # 两个已测量的候选在各自占用的位置间按延迟交换
+    assert tracker.order_domains("api", _DOMAINS) == ["spare", "backup", "primary"]
+
+
+def test_failures_count_as_a_full_timeout(clock):
+    tracker = HealthTracker()
+    tracker.record("api", "primary", True, 1.0)
+    tracker.record("api", "backup", True, 2.0)
+    _fail(tracker, "primary")
+
+    assert _circuit(tracker, "primary").latency_ms > 2000
+    assert tracker.order_domains("api", _DOMAINS)[:2] == ["backup", "primary"]
+
+
+def test_circuit_opens_after_consecutive_failures(clock):
+    tracker = HealthTracker()
+    _fail(tracker, "primary", 2)
+    assert not _circuit(tracker, "primary").circuit_open
+    assert "primary" in tracker.order_domains("api", _DOMAINS)
+
+    _fail(tracker, "primary")
+
+    assert _circuit(tracker, "primary").circuit_open
+    assert tracker.order_domains("api", _DOMAINS) == ["backup", "spare"]
+    assert tracker.open_circuits() == [("api", "primary")]
+
+
+def test_success_before_the_threshold_resets_the_count(clock):
+    tracker = HealthTracker()
+    _fail(tracker, "primary", 2)
+    tracker.record("api", "primary", True, 0.1)
+    _fail(tracker, "primary", 2)
+
+    assert not _circuit(tracker, "primary").circuit_open
+
+
+def test_half_open_circuit_is_tried_again_and_closes_on_success(clock):
+    tracker = HealthTracker()
+    _fail(tracker, "primary", 3)
+
+    clock.now += 61
+    # 熔断时长已过：重新参与排序，但仍等待探测或请求成功
+    assert not _circuit(tracker, "primary").circuit_open
+    assert "primary" in tracker.order_domains("api", _DOMAINS)
+    assert tracker.open_circuits() == [("api", "primary")]
+
+    tracker.record("api", "primary", True, 0.1)
+
+    assert tracker.open_circuits() == []
+    assert _circuit(tracker, "primary").consecutive_failures == 0
+
+
+def test_failure_while_half_open_reopens_with_a_fresh_timer(clock):
+    tracker = HealthTracker()
+    _fail(tracker, "primary", 3)
+    clock.now += 61
+
+    _fail(tracker, "primary")
+
+    assert _circuit(tracker, "primary").circuit_open
+    clock.now += 59
+    assert "primary" not in tracker.order_domains("api", _DOMAINS)
+    clock.now += 2
+    assert "primary" in tracker.order_domains("api", _DOMAINS)
+
+
+def test_all_open_falls_back_to_the_configured_order(clock):
+    tracker = HealthTracker()
+    for domain in _DOMAINS:
+        _fail(tracker, domain, 3)
+
+    assert tracker.order_domains("api", _DOMAINS) == _DOMAINS
+
+
+def test_impl_entries_aggregate_their_domains(clock):
+    tracker = HealthTracker()
+    _fail(tracker, "primary", 2)
+    _fail(tracker, "backup")
+
+    assert tracker.order_impls(["api", "html"]) == ["html"]
@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from threading import Barrier, Lock, Thread
+
+from backend.app.core.config import settings
+from backend.app.db.session import SessionLocal
+from backend.app.models.job import DownloadJob, JobStatus, JobType
+from backend.app.workers import job_runner
+from backend.app.workers.job_runner import (
+    LEASE_EXPIRED_MESSAGE,
+    WORKER_ID,
+    _claim_next_job,
+    _expire_stale_leases,
+    _STAGES,
+)
+
+_DOWNLOAD, _MERGE = _STAGES
+
+
+def _add_job(db, user, status=JobStatus.QUEUED, **values) -> DownloadJob:
+    job = DownloadJob(user_id=user.id, job_type=JobType.ALBUM, payload_json="{}", status=status, **values)
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def _claim_concurrently(stage, claimers: int) -> list[int]:
+    """Run `claimers` threads, each with its own session, claiming until the stage is empty."""
+    claimed: list[int] = []
+    lock = Lock()
+    start = Barrier(claimers)
+
+    def claimer() -> None:
+        session = SessionLocal()
+        try:
+            start.wait()
+            while (job_id := _claim_next_job(session, stage)) is not None:
+                with lock:
+                    claimed.append(job_id)
+        finally:
+            session.close()
+
+    threads = [Thread(target=claimer) for _ in range(claimers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return claimed
+
+
+def test_only_one_of_many_claimers_gets_a_job(db, make_user):
+    job = _add_job(db, make_user("alice"))
+
+    claimed = _claim_concurrently(_DOWNLOAD, claimers=8)
+
+    assert claimed == [job.id]
+    db.refresh(job)
+    assert job.status == JobStatus.RUNNING
+    assert job.lease_owner == WORKER_ID
+    assert job.attempts == 1
+    assert job.lease_expires_at is not None
+
+
+def test_concurrent_claimers_take_every_job_exactly_once(db, make_user, monkeypatch):
+    monkeypatch.setattr(settings, "user_max_running_jobs", 0)
+    users = [make_user(name) for name in ("alice", "bob", "carol")]
+    job_ids = [_add_job(db, users[index % 3]).id for index in range(12)]
+
+    claimed = _claim_concurrently(_DOWNLOAD, claimers=4)
+
+    assert sorted(claimed) == job_ids
+    db.expire_all()
+    assert {job.status for job in db.query(DownloadJob)} == {JobStatus.RUNNING}
+
+
+def test_claims_rotate_between_users(db, make_user, monkeypatch):
+    monkeypatch.setattr(settings, "user_max_running_jobs", 0)
+    alice, bob = make_user("alice"), make_user("bob")
+    alice_jobs = [_add_job(db, alice).id for _ in range(3)]
+    bob_job = _add_job(db, bob).id
+
+    # alice 排队在前，但她已有任务在运行后 bob 先于她的第二个任务被认领
+    assert _claim_next_job(db, _DOWNLOAD) == alice_jobs[0]
+    assert _claim_next_job(db, _DOWNLOAD) == bob_job
+    assert _claim_next_job(db, _DOWNLOAD) == alice_jobs[1]
+
+
+def test_user_running_cap_skips_users_at_the_limit(db, make_user, monkeypatch):
+    monkeypatch.setattr(settings, "user_max_running_jobs", 1)
+    alice = make_user("alice")
+    _add_job(db, alice)
+    _add_job(db, alice)
+
+    assert _claim_next_job(db, _DOWNLOAD) is not None
+    assert _claim_next_job(db, _DOWNLOAD) is None
+
+
+def test_stale_leases_are_released_by_stage_and_attempts(db, make_user, monkeypatch):
+    monkeypatch.setattr(settings, "job_max_attempts", 3)
+    monkeypatch.setattr(job_runner, "cleanup_job_artifacts", lambda _job_id: None)
+    user = make_user("alice")
+    now = datetime.now(timezone.utc)
+    past, future = now - timedelta(seconds=5), now + timedelta(minutes=5)
+    lease = {"lease_owner": "gone:1:abcd"}
+
+    interrupted = _add_job(db, user, JobStatus.RUNNING, lease_expires_at=past, attempts=1, **lease)
+    exhausted = _add_job(db, user, JobStatus.RUNNING, lease_expires_at=past, attempts=3, **lease)
+    merging = _add_job(db, user, JobStatus.MERGING, lease_expires_at=past, attempts=1, **lease)
+    legacy = _add_job(db, user, JobStatus.RUNNING, attempts=1)
+    healthy = _add_job(db, user, JobStatus.RUNNING, lease_expires_at=future, attempts=1, **lease)
+
+    assert _expire_stale_leases(db) == 4
+
+    db.expire_all()
+    assert (interrupted.status, interrupted.lease_owner, interrupted.attempts) == (JobStatus.QUEUED, None, 1)
+    assert (exhausted.status, exhausted.error_message) == (JobStatus.FAILED, LEASE_EXPIRED_MESSAGE)
+    assert (merging.status, merging.attempts) == (JobStatus.DOWNLOADED, 2)
+    assert legacy.status == JobStatus.QUEUED
+    assert (healthy.status, healthy.lease_owner) == (JobStatus.RUNNING, "gone:1:abcd")
+
+
+def test_released_jobs_are_reclaimed_once_under_concurrent_claimers(db, make_user, monkeypatch):
+    monkeypatch.setattr(settings, "user_max_running_jobs", 0)
+    monkeypatch.setattr(job_runner, "cleanup_job_artifacts", lambda _job_id: None)
+    user = make_user("alice")
+    past = datetime.now(timezone.utc) - timedelta(seconds=5)
+    downloads = [
+        _add_job(db, user, JobStatus.RUNNING, lease_owner="gone:1:abcd", lease_expires_at=past, attempts=1).id
+        for _ in range(3)
+    ]
+    merge = _add_job(db, user, JobStatus.MERGING, lease_owner="gone:1:abcd", lease_expires_at=past).id
+
+    _expire_stale_leases(db)
+
+    assert sorted(_claim_concurrently(_DOWNLOAD, claimers=4)) == downloads
+    assert _claim_concurrently(_MERGE, claimers=4) == [merge]
+    db.expire_all()
+    # 重新认领下载阶段计入一次尝试，合并阶段的中断已在回收时计入
+    assert [job.attempts for job in db.query(DownloadJob).order_by(DownloadJob.id)] == [2, 2, 2, 1]
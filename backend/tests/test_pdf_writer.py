@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+from io import BytesIO
+from pathlib import Path
+import re
+import struct
+import zlib
+
+from PIL import Image
+import pytest
+
+from backend.app.models.job import OutputProfile
+from backend.app.services.image_pdf_service import ENCODING_PROFILES, PageStats, _jpeg_quality, merge_tree_to_pdf
+from backend.app.utils.pdf_writer import DEFAULT_DPI, StreamingPdfWriter
+
+_IMAGE_OBJECT = re.compile(
+    rb"(\d+) 0 obj\n<< (/Type /XObject /Subtype /Image .*?) /Length (\d+) >>\nstream\n",
+    re.DOTALL,
+)
+_MEDIA_BOX = re.compile(rb"/MediaBox \[0 0 ([\d.]+) ([\d.]+)\]")
+
+
+def _embedded_images(data: bytes) -> list[tuple[str, bytes]]:
+    images = []
+    for match in _IMAGE_OBJECT.finditer(data):
+        length = int(match.group(3))
+        images.append((match.group(2).decode("ascii"), data[match.end() : match.end() + length]))
+    return images
+
+
+def _assert_xref_consistent(data: bytes) -> None:
+    xref_offset = int(data.rsplit(b"startxref\n", 1)[1].split(b"\n", 1)[0])
+    assert data[xref_offset:].startswith(b"xref\n")
+    lines = data[xref_offset:].split(b"\n")
+    count = int(lines[1].split()[1])
+    for object_id in range(1, count):
+        offset = int(lines[2 + object_id].split()[0])
+        assert data[offset:].startswith(f"{object_id} 0 obj\n".encode("ascii"))
+
+
+def _png_idat(path: Path) -> bytes:
+    raw = path.read_bytes()
+    position, chunks = 8, []
+    while position < len(raw):
+        length, chunk_type = struct.unpack(">I4s", raw[position : position + 8])
+        if chunk_type == b"IDAT":
+            chunks.append(raw[position + 8 : position + 8 + length])
+        position += length + 12
+    return b"".join(chunks)
+
+
+def _page(path: Path, mode: str, size: tuple[int, int], image_format: str, color=None, **options) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if color is None:
+        color = 128 if mode == "L" else (200, 40, 90)
+    Image.new(mode, size, color).save(path, image_format, **options)
+    return path
+
+
+def _merge(tmp_path: Path, profile: OutputProfile) -> tuple[bytes, PageStats]:
+    stats = PageStats()
+    output = merge_tree_to_pdf(
+        tmp_path / "src",
+        tmp_path / "out.pdf",
+        tmp_path / "pages",
+        stats=stats,
+        profile=ENCODING_PROFILES[profile],
+    )
+    assert not output.with_name("out.pdf.part").exists()
+    return output.read_bytes(), stats
+
+
+def test_archive_embeds_jpeg_pages_verbatim(tmp_path):
+    color = _page(tmp_path / "src" / "1" / "00001.jpg", "RGB", (300, 450), "JPEG", quality=92)
+    gray = _page(tmp_path / "src" / "1" / "00002.jpg", "L", (200, 300), "JPEG", quality=92)
+
+    data, stats = _merge(tmp_path, OutputProfile.ARCHIVE)
+
+    assert (stats.passthrough, stats.reencoded) == (2, 0)
+    images = _embedded_images(data)
+    assert [body for _header, body in images] == [color.read_bytes(), gray.read_bytes()]
+    assert "/DeviceRGB" in images[0][0] and "/DCTDecode" in images[0][0]
+    assert "/DeviceGray" in images[1][0]
+    _assert_xref_consistent(data)
+
+
+def test_archive_embeds_png_pages_as_flate_streams(tmp_path):
+    page = _page(tmp_path / "src" / "1" / "00001.png", "RGB", (120, 80), "PNG")
+
+    data, stats = _merge(tmp_path, OutputProfile.ARCHIVE)
+
+    assert (stats.passthrough, stats.reencoded) == (1, 0)
+    [(header, body)] = _embedded_images(data)
+    assert "/FlateDecode" in header and "/Predictor 15" in header and "/Colors 3" in header
+    # IDAT 数据原样拷贝，解压后每行是一个过滤类型字节加像素数据
+    assert body == _png_idat(page)
+    assert len(zlib.decompress(body)) == 80 * (1 + 120 * 3)
+    _assert_xref_consistent(data)
+
+
+def test_pages_use_the_default_dpi_whatever_the_file_declares(tmp_path):
+    _page(tmp_path / "src" / "1" / "00001.jpg", "RGB", (960, 480), "JPEG", dpi=(300, 300))
+    _page(tmp_path / "src" / "1" / "00002.png", "RGB", (960, 480), "PNG", dpi=(72, 72))
+
+    data, _stats = _merge(tmp_path, OutputProfile.ARCHIVE)
+
+    expected = (72 * 960 / DEFAULT_DPI, 72 * 480 / DEFAULT_DPI)
+    boxes = [(float(width), float(height)) for width, height in _MEDIA_BOX.findall(data)]
+    assert boxes == [expected, expected]
+
+
+def test_lossy_profile_reencodes_png_and_high_quality_jpeg(tmp_path):
+    profile = ENCODING_PROFILES[OutputProfile.MOBILE]
+    _page(tmp_path / "src" / "1" / "00001.png", "RGB", (1600, 2000), "PNG")
+    _page(tmp_path / "src" / "1" / "00002.jpg", "RGB", (800, 1000), "JPEG", quality=95)
+    kept = _page(tmp_path / "src" / "1" / "00003.jpg", "RGB", (800, 1000), "JPEG", quality=profile.jpeg_quality)
+    _page(tmp_path / "src" / "1" / "00004.jpg", "L", (800, 1000), "JPEG", quality=95)
+
+    data, stats = _merge(tmp_path, OutputProfile.MOBILE)
+
+    assert (stats.passthrough, stats.reencoded) == (1, 3)
+    images = _embedded_images(data)
+    assert images[2][1] == kept.read_bytes()
+    for header, body in (images[0], images[1], images[3]):
+        assert "/DCTDecode" in header
+        with Image.open(BytesIO(body)) as encoded:
+            assert encoded.format == "JPEG"
+            assert encoded.width <= profile.max_width
+            assert _jpeg_quality(encoded) == profile.jpeg_quality
+    assert "/Width 1080 " in images[0][0]
+    assert "/DeviceGray" in images[3][0]
+    _assert_xref_consistent(data)
+
+
+def test_balanced_profile_stores_monochrome_colour_pages_as_grayscale(tmp_path):
+    _page(tmp_path / "src" / "1" / "00001.jpg", "RGB", (400, 600), "JPEG", color=(90, 90, 90), quality=80)
+
+    data, stats = _merge(tmp_path, OutputProfile.BALANCED)
+
+    assert (stats.passthrough, stats.reencoded) == (0, 1)
+    [(header, _body)] = _embedded_images(data)
+    assert "/DeviceGray" in header
+
+
+def test_writer_rejects_formats_it_cannot_embed(tmp_path):
+    page = _page(tmp_path / "page.webp", "RGB", (10, 10), "WEBP")
+    with StreamingPdfWriter(BytesIO()) as writer:
+        with pytest.raises(ValueError):
+            writer.add_image(page)
+        writer.add_image(_page(tmp_path / "page.jpg", "RGB", (10, 10), "JPEG"))
+    assert writer.page_count == 1
@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event, Lock
+import time
+
+import pytest
+
+from backend.app.core.config import settings
+from backend.app.services.response_cache import ResponseCache
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    monkeypatch.setattr(settings, "response_cache_backend", "memory")
+    return ResponseCache()
+
+
+class _BlockingLoader:
+    """Loader that holds its first call until released and counts every call."""
+
+    def __init__(self, result="value") -> None:
+        self.result = result
+        self.calls = 0
+        self.started = Event()
+        self.release = Event()
+        self._lock = Lock()
+
+    def __call__(self):
+        with self._lock:
+            self.calls += 1
+            first = self.calls == 1
+        if first:
+            self.started.set()
+            self.release.wait(5)
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+def _wait_for_coalesced(cache: ResponseCache, namespace: str, count: int) -> None:
+    deadline = time.monotonic() + 5
+    while cache.stats()["namespaces"][namespace]["coalesced"] < count:
+        assert time.monotonic() < deadline, "waiters never joined the in-flight request"
+        time.sleep(0.01)
+
+
+def test_concurrent_misses_share_one_upstream_call(cache):
+    loader = _BlockingLoader(["a", "b"])
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        owner = executor.submit(cache.get_or_load, "search", ("q", 1), 60, loader)
+        assert loader.started.wait(5)
+        waiters = [executor.submit(cache.get_or_load, "search", ("q", 1), 60, loader) for _ in range(4)]
+        _wait_for_coalesced(cache, "search", 4)
+        loader.release.set()
+        results = [owner.result(5)] + [future.result(5) for future in waiters]
+
+    assert results == [["a", "b"]] * 5
+    assert loader.calls == 1
+    # 结果已写入缓存，之后的请求直接命中
+    assert cache.get_or_load("search", ("q", 1), 60, loader) == ["a", "b"]
+    stats = cache.stats()["namespaces"]["search"]
+    assert (stats["misses"], stats["coalesced"], stats["hits"]) == (1, 4, 1)
+
+
+def test_errors_reach_every_waiter_and_are_not_cached(cache):
+    loader = _BlockingLoader(RuntimeError("upstream down"))
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        owner = executor.submit(cache.get_or_load, "ranking", (1,), 60, loader)
+        assert loader.started.wait(5)
+        waiters = [executor.submit(cache.get_or_load, "ranking", (1,), 60, loader) for _ in range(2)]
+        _wait_for_coalesced(cache, "ranking", 2)
+        loader.release.set()
+        for future in [owner, *waiters]:
+            with pytest.raises(RuntimeError, match="upstream down"):
+                future.result(5)
+
+    assert loader.calls == 1
+    assert cache.get_or_load("ranking", (1,), 60, lambda: "recovered") == "recovered"
+    assert cache.stats()["namespaces"]["ranking"]["errors"] == 1
+
+
+def test_waiter_gives_up_on_a_stuck_request_and_loads_itself(cache, monkeypatch):
+    # 等待上限为 JM_TIMEOUT_SECONDS 的两倍
+    monkeypatch.setattr(settings, "jm_timeout_seconds", 0.1)
+    stuck = _BlockingLoader("late")
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        owner = executor.submit(cache.get_or_load, "album", (42,), 60, stuck)
+        assert stuck.started.wait(5)
+        started = time.monotonic()
+        waiter = executor.submit(cache.get_or_load, "album", (42,), 60, lambda: "fresh")
+        assert waiter.result(5) == "fresh"
+        waited = time.monotonic() - started
+        stuck.release.set()
+        assert owner.result(5) == "late"
+
+    assert 0.15 <= waited < 2
+    stats = cache.stats()["namespaces"]["album"]
+    assert (stats["coalesced"], stats["wait_timeouts"]) == (1, 1)
+
+
+def test_zero_ttl_bypasses_the_cache(cache):
+    calls = []
+    for _ in range(2):
+        assert cache.get_or_load("search", ("q",), 0, lambda: calls.append(1) or "value") == "value"
+    assert len(calls) == 2